@@ -1,55 +1,141 @@
 """Configuration management for MixSync."""
 
+import functools
 import os
+from dataclasses import dataclass
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
 
-class Config:
-    """Application configuration."""
-    
+@functools.cache
+def bootstrap():
+    """Load the .env file into the environment, once.
+
+    Skipped when MIXSYNC_LOAD_DOTENV is set to anything other than '1' or
+    when there is no .env file, so deployments that already provide real
+    environment variables never pay for (or get overridden by) dotenv.
+    """
+    if os.getenv('MIXSYNC_LOAD_DOTENV', '1') == '1' and Path('.env').exists():
+        from dotenv import load_dotenv
+        load_dotenv()
+
+
+_TRUE = frozenset({'true', '1', 'yes', 'on'})
+
+
+def _env_bool(key: str, default: str) -> bool:
+    """Read a boolean flag from the environment."""
+    return os.getenv(key, default).lower() in _TRUE
+
+
+def _playlist_uri() -> str:
+    """Read SPOTIFY_PLAYLIST_ID and normalize it to a playlist URI."""
+    playlist_id = os.getenv('SPOTIFY_PLAYLIST_ID')
+    if playlist_id and not playlist_id.startswith('spotify:playlist:'):
+        return f"spotify:playlist:{playlist_id}"
+    return playlist_id
+
+
+# Setting name -> loader; _load() evaluates them all on first access
+_SETTINGS = {
     # Spotify API
-    SPOTIPY_CLIENT_ID = os.getenv('SPOTIPY_CLIENT_ID')
-    SPOTIPY_CLIENT_SECRET = os.getenv('SPOTIPY_CLIENT_SECRET')
-    SPOTIPY_REDIRECT_URI = os.getenv('SPOTIPY_REDIRECT_URI', 'http://127.0.0.1:8888/callback')
-    
+    'SPOTIPY_CLIENT_ID': lambda: os.getenv('SPOTIPY_CLIENT_ID'),
+    'SPOTIPY_CLIENT_SECRET': lambda: os.getenv('SPOTIPY_CLIENT_SECRET'),
+    'SPOTIPY_REDIRECT_URI': lambda: os.getenv('SPOTIPY_REDIRECT_URI', 'http://127.0.0.1:8888/callback'),
+
     # Playlist settings
-    _playlist_id = os.getenv('SPOTIFY_PLAYLIST_ID')
-    SPOTIFY_PLAYLIST_ID = f"spotify:playlist:{_playlist_id}" if _playlist_id and not _playlist_id.startswith('spotify:playlist:') else _playlist_id
-    POLL_INTERVAL_SECONDS = int(os.getenv('POLL_INTERVAL_SECONDS', 30))
-    
+    'SPOTIFY_PLAYLIST_ID': _playlist_uri,
+    'POLL_INTERVAL_SECONDS': lambda: int(os.getenv('POLL_INTERVAL_SECONDS', 30)),
+
     # Download settings
-    DOWNLOAD_PATH = Path(os.getenv('DOWNLOAD_PATH', './downloads'))
-    MAX_RECENT_DOWNLOADS = int(os.getenv('MAX_RECENT_DOWNLOADS', 10))
-    
+    'DOWNLOAD_PATH': lambda: Path(os.getenv('DOWNLOAD_PATH', './downloads')),
+    'MAX_RECENT_DOWNLOADS': lambda: int(os.getenv('MAX_RECENT_DOWNLOADS', 10)),
+    'DOWNLOAD_CONCURRENCY': lambda: int(os.getenv('DOWNLOAD_CONCURRENCY', 4)),
+    'DOWNLOADS_PER_MINUTE': lambda: float(os.getenv('DOWNLOADS_PER_MINUTE', 30)),
+
     # Web server settings
-    WEB_HOST = os.getenv('WEB_HOST', 'localhost')
-    WEB_PORT = int(os.getenv('WEB_PORT', 3000))
-    
+    'WEB_HOST': lambda: os.getenv('WEB_HOST', 'localhost'),
+    'WEB_PORT': lambda: int(os.getenv('WEB_PORT', 3000)),
+
     # Logging settings
-    ENABLE_FILE_LOGGING = os.getenv('ENABLE_FILE_LOGGING', 'true').lower() in ('true', '1', 'yes', 'on')
-    
+    'ENABLE_FILE_LOGGING': lambda: _env_bool('ENABLE_FILE_LOGGING', 'true'),
+
     # Metadata settings
-    ENABLE_METADATA_TAGGING = os.getenv('ENABLE_METADATA_TAGGING', 'true').lower() in ('true', '1', 'yes', 'on')
-    ENABLE_BPM_DETECTION = os.getenv('ENABLE_BPM_DETECTION', 'true').lower() in ('true', '1', 'yes', 'on')
-    DEFAULT_GENRE = os.getenv('DEFAULT_GENRE', 'Electronic')
-    
+    'ENABLE_METADATA_TAGGING': lambda: _env_bool('ENABLE_METADATA_TAGGING', 'true'),
+    'ENABLE_BPM_DETECTION': lambda: _env_bool('ENABLE_BPM_DETECTION', 'true'),
+    'DEFAULT_GENRE': lambda: os.getenv('DEFAULT_GENRE', 'Electronic'),
+}
+
+
+@dataclass(slots=True, frozen=True)
+class _Cfg:
+    """Immutable snapshot of every setting, one field per _SETTINGS entry."""
+
+    spotipy_client_id: str | None
+    spotipy_client_secret: str | None
+    spotipy_redirect_uri: str
+    spotify_playlist_id: str | None
+    poll_interval_seconds: int
+    download_path: Path
+    max_recent_downloads: int
+    download_concurrency: int
+    downloads_per_minute: float
+    web_host: str
+    web_port: int
+    enable_file_logging: bool
+    enable_metadata_tagging: bool
+    enable_bpm_detection: bool
+    default_genre: str
+
+
+@functools.cache
+def _load() -> _Cfg:
+    """Read every setting from the environment, once."""
+    bootstrap()
+    return _Cfg(**{name.lower(): loader() for name, loader in _SETTINGS.items()})
+
+
+class _LazyConfig(type):
+    """Metaclass that exposes the _Cfg fields as upper-case class attributes."""
+
+    def __getattr__(cls, name):
+        if name not in _SETTINGS:
+            raise AttributeError(f"type object '{cls.__name__}' has no attribute '{name}'")
+
+        # Read through to the frozen snapshot on every access rather than
+        # copying values onto the (mutable) class
+        return getattr(_load(), name.lower())
+
+    def __setattr__(cls, name, value):
+        if name in _SETTINGS:
+            raise AttributeError(f"Config.{name} is read-only")
+        super().__setattr__(name, value)
+
+
+class Config(metaclass=_LazyConfig):
+    """Application configuration.
+
+    Settings are read-only views of the _Cfg snapshot, loaded on first
+    access, so Config.WEB_PORT style call sites keep working.
+    """
+
     @classmethod
+    @functools.lru_cache(maxsize=1)
     def validate(cls) -> list[str]:
-        """Validate required configuration values."""
+        """Validate required configuration values.
+
+        Settings are read once and cached, so the result is memoized too.
+        """
         errors = []
-        
+
         if not cls.SPOTIPY_CLIENT_ID:
             errors.append("SPOTIPY_CLIENT_ID is required")
         if not cls.SPOTIPY_CLIENT_SECRET:
             errors.append("SPOTIPY_CLIENT_SECRET is required")
         if not cls.SPOTIFY_PLAYLIST_ID:
             errors.append("SPOTIFY_PLAYLIST_ID is required")
-            
+
         return errors
-    
+
     @classmethod
     def setup_directories(cls):
         """Create necessary directories."""
@@ -1,20 +1,50 @@
 """Main application entry point for MixSync."""
 
 import asyncio
+import functools
 import logging
 import sys
-import signal
 from typing import Optional
 from pathlib import Path
 
-import uvicorn
-from colorama import init, Fore, Style
-init(autoreset=True)
+from config import Config, bootstrap
 
-from config import Config
-from services.playlist_sync import PlaylistSyncService
-from services.database_service import DatabaseService
-from web.app import app, database_service
+
+class _NoColor:
+    """Stand-in for colorama's Fore/Style that renders every code as ''."""
+    
+    def __getattr__(self, name):
+        return ''
+
+
+@functools.cache
+def _color():
+    """Return colorama's (Fore, Style), or no-op stand-ins.
+    
+    Colors are skipped for --no-color and when stdout is not a terminal, in
+    which case colorama is never imported.
+    """
+    if '--no-color' in sys.argv or not sys.stdout.isatty():
+        return _NoColor(), _NoColor()
+    
+    from colorama import init, Fore, Style
+    init(autoreset=True)
+    return Fore, Style
+
+def _loop_factory():
+    """Return uvloop's event loop factory, or None for the asyncio default.
+    
+    uvicorn only picks its loop when it creates one itself; here it is served
+    from our own loop, so uvloop has to be chosen when that loop is created.
+    """
+    if sys.platform == 'win32':
+        return None
+    try:
+        import uvloop
+    except ImportError:
+        logger.warning("uvloop is not installed, using the default asyncio event loop")
+        return None
+    return uvloop.new_event_loop
 
 # Setup logging
 def setup_logging():
@@ -31,8 +61,6 @@ def setup_logging():
         handlers=handlers
     )
 
-setup_logging()
-
 logger = logging.getLogger(__name__)
 
 class AudioFetcherApp:
@@ -41,11 +69,14 @@ class AudioFetcherApp:
     def __init__(self):
         """Initialize the application."""
         self.playlist_sync = None
+        self.app = None
+        self.database_service = None
         self.web_server_task = None
         self.running = False
         
     def print_banner(self):
         """Print application banner."""
+        Fore, Style = _color()
         banner = f"""
 {Fore.CYAN}╔══════════════════════════════════════════════════╗
 ║                 {Fore.YELLOW}MixSync{Fore.CYAN}                    ║
@@ -64,6 +95,7 @@ class AudioFetcherApp:
         Returns:
             True if configuration is valid
         """
+        Fore, Style = _color()
         errors = Config.validate()
         
         if errors:
@@ -86,16 +118,20 @@ class AudioFetcherApp:
     
     async def start_web_server(self):
         """Start the web server."""
+        import uvicorn
+        Fore, Style = _color()
         try:
             logger.info(f"Starting web server on {Config.WEB_HOST}:{Config.WEB_PORT}")
             print(f"{Fore.BLUE}🌐 Web Interface:{Style.RESET_ALL} http://localhost:{Config.WEB_PORT}")
             
             config = uvicorn.Config(
-                app,
+                self.app,
                 host=Config.WEB_HOST,
                 port=Config.WEB_PORT,
                 log_level="info",
-                access_log=False
+                access_log=False,
+                http="httptools",
+                ws="websockets"
             )
             server = uvicorn.Server(config)
             await server.serve()
@@ -106,12 +142,14 @@ class AudioFetcherApp:
     
     async def start_playlist_sync(self):
         """Start the playlist sync service."""
+        from services.playlist_sync import PlaylistSyncService
+        Fore, Style = _color()
         try:
             print(f"{Fore.GREEN}🎵 Playlist Sync:{Style.RESET_ALL} Starting automated monitoring...")
             print(f"   Smart polling: {Config.POLL_INTERVAL_SECONDS}s (adapts to activity)")
             print(f"   Playlist ID: {Config.SPOTIFY_PLAYLIST_ID}")
             
-            self.playlist_sync = PlaylistSyncService()
+            self.playlist_sync = PlaylistSyncService(self.database_service)
             await self.playlist_sync.start_monitoring()
             
         except Exception as e:
@@ -120,52 +158,59 @@ class AudioFetcherApp:
     
     async def run(self):
         """Run the main application."""
+        import signal
+        Fore, Style = _color()
         self.running = True
         
-        # Print banner and validate config
-        self.print_banner()
-        
-        if not self.validate_config():
-            return 1
-        
-        # Setup signal handlers for graceful shutdown
-        def signal_handler(signum, frame):
-            logger.info(f"Received signal {signum}, shutting down...")
-            self.stop()
-        
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
+        # The web app pulls in FastAPI and Jinja2, so it is loaded here rather
+        # than at import time; its database service is shared with playlist sync
+        from web.app import app, database_service
+        self.app = app
+        self.database_service = database_service
         
         try:
-            # Initialize database
-            print(f"{Fore.BLUE}🗄️  Database:{Style.RESET_ALL} Initializing SQLite database...")
-            await database_service.initialize()
-            print(f"{Fore.GREEN}✓{Style.RESET_ALL} Database ready")
-            
-            # Start services concurrently
-            tasks = []
-            
-            # Start web server
-            web_task = asyncio.create_task(self.start_web_server())
-            tasks.append(web_task)
-            
-            # Start playlist sync
-            sync_task = asyncio.create_task(self.start_playlist_sync())
-            tasks.append(sync_task)
-            
-            print(f"\n{Fore.GREEN}✨ MixSync is running!{Style.RESET_ALL}")
-            print(f"{Fore.YELLOW}Press Ctrl+C to stop{Style.RESET_ALL}\n")
-            
-            # Wait for any task to complete (usually due to error or shutdown)
-            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
-            
-            # Cancel remaining tasks
-            for task in pending:
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
+            async with asyncio.TaskGroup() as tg:
+                # Open and migrate the database while the banner is printed and
+                # the config and directories are checked in a worker thread
+                init_task = tg.create_task(database_service.initialize())
+                
+                self.print_banner()
+                
+                if not await asyncio.to_thread(self.validate_config):
+                    init_task.cancel()
+                    self.running = False
+                    return 1
+                
+                # Setup signal handlers for graceful shutdown
+                def signal_handler(signum, frame):
+                    logger.info(f"Received signal {signum}, shutting down...")
+                    self.stop()
+                
+                signal.signal(signal.SIGINT, signal_handler)
+                signal.signal(signal.SIGTERM, signal_handler)
+                
+                print(f"{Fore.BLUE}🗄️  Database:{Style.RESET_ALL} Initializing SQLite database...")
+                await init_task
+                print(f"{Fore.GREEN}✓{Style.RESET_ALL} Database ready")
+                
+                # Start services concurrently
+                services = [
+                    tg.create_task(self.start_web_server()),
+                    tg.create_task(self.start_playlist_sync()),
+                ]
+                
+                # When either service stops (usually due to error or shutdown),
+                # cancel the other so the task group can exit
+                def cancel_services(finished):
+                    for task in services:
+                        if task is not finished:
+                            task.cancel()
+                
+                for task in services:
+                    task.add_done_callback(cancel_services)
+                
+                print(f"\n{Fore.GREEN}✨ MixSync is running!{Style.RESET_ALL}")
+                print(f"{Fore.YELLOW}Press Ctrl+C to stop{Style.RESET_ALL}\n")
             
             return 0
             
@@ -173,17 +218,23 @@ class AudioFetcherApp:
             logger.info("Received keyboard interrupt")
             return 0
         except Exception as e:
+            # Report the task's own error rather than the TaskGroup wrapper
+            if isinstance(e, ExceptionGroup):
+                e = e.exceptions[0]
             logger.error(f"Application error: {e}")
             print(f"{Fore.RED}✗{Style.RESET_ALL} Application error: {e}")
             return 1
         finally:
             self.stop()
-    
+            await database_service.aclose()
+
     def stop(self):
         """Stop all services."""
         if not self.running:
             return
         
+        Fore, Style = _color()
+        
         self.running = False
         print(f"\n{Fore.YELLOW}🛑 Shutting down MixSync...{Style.RESET_ALL}")
         
@@ -195,9 +246,13 @@ class AudioFetcherApp:
 
 def main():
     """Main entry point."""
+    Fore, Style = _color()
     try:
+        bootstrap()
+        setup_logging()
         app = AudioFetcherApp()
-        return asyncio.run(app.run())
+        with asyncio.Runner(loop_factory=_loop_factory()) as runner:
+            return runner.run(app.run())
     except KeyboardInterrupt:
         print(f"\n{Fore.YELLOW}Interrupted by user{Style.RESET_ALL}")
         return 0
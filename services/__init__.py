@@ -1,9 +1,28 @@
 """Services package for MixSync."""
 
-from .spotify_service import SpotifyService
-from .download_service import DownloadService
-from .playlist_sync import PlaylistSyncService
-from .database_service import DatabaseService
-from .metadata_service import MetadataService
+import importlib
+
+# Exported name -> submodule; imported on first access (PEP 562) so that
+# importing the package doesn't pull in spotipy, yt-dlp or mutagen
+_LAZY_IMPORTS = {
+    'SpotifyService': '.spotify_service',
+    'DownloadService': '.download_service',
+    'PlaylistSyncService': '.playlist_sync',
+    'DatabaseService': '.database_service',
+    'MetadataService': '.metadata_service',
+}
 
 __all__ = ['SpotifyService', 'DownloadService', 'PlaylistSyncService', 'DatabaseService', 'MetadataService']
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(_LAZY_IMPORTS[name], __name__)
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,39 @@
+"""Constants shared between services."""
+
+import re
+
+# Characters that are invalid in filenames on common filesystems, as a
+# str.translate table that deletes them
+INVALID_FILENAME_CHARS = str.maketrans('', '', '<>:"/\\|?*')
+
+# Common YouTube/video artifacts stripped from both downloaded filenames and
+# metadata titles
+_VIDEO_ARTIFACTS = [
+    r'\[Official\s*(Music\s*)?Video\]',
+    r'\(Official\s*(Music\s*)?Video\)',
+    r'\[Official\s*Audio\]',
+    r'\(Official\s*Audio\)',
+    r'\[Lyrics?\]',
+    r'\(Lyrics?\)',
+    r'\[HD\]',
+    r'\(HD\)',
+    r'\[4K\]',
+    r'\(4K\)',
+    r'\[Music\s*Video\]',
+    r'\(Music\s*Video\)',
+    r'\[Visualizer\]',
+    r'\(Visualizer\)',
+    r'\[Lyric\s*Video\]',
+    r'\(Lyric\s*Video\)',
+]
+
+# Explicit tags are only dropped from metadata titles; filenames keep them
+_EXPLICIT_TAGS = [
+    r'\[Explicit\]',
+    r'\(Explicit\)',
+]
+
+# Each list compiled once into a single alternation
+FILENAME_ARTIFACT_RE = re.compile('|'.join(_VIDEO_ARTIFACTS), re.IGNORECASE)
+EXPLICIT_TAG_RE = re.compile('|'.join(_EXPLICIT_TAGS), re.IGNORECASE)
+ARTIFACT_RE = re.compile('|'.join(_VIDEO_ARTIFACTS + _EXPLICIT_TAGS), re.IGNORECASE)
@@ -1,61 +1,287 @@
 """Database service for tracking download history using SQLite."""
 
 import aiosqlite
+import asyncio
+import contextlib
+import functools
 import logging
-from datetime import datetime
+import re
+import time
 from pathlib import Path
-from typing import List, Dict, Optional
-from config import Config
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Read-only connections for listings, search, counts and stats. aiosqlite
+# runs each connection's queries one at a time on its own thread; with WAL,
+# several connections can read in parallel alongside the writer.
+_READ_POOL_SIZE = 4
+
+# Timestamps are stored as INTEGER milliseconds since the Unix epoch
+_DOWNLOADS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        original_url TEXT,
+        source_type TEXT,  -- 'playlist' or 'manual'
+        file_size INTEGER,
+        file_path TEXT,
+        artist TEXT,
+        track_name TEXT,
+        search_query TEXT,
+        spotify_track_id TEXT,
+        download_status TEXT,  -- 'completed', 'failed', 'processing'
+        error_message TEXT,
+        created_at INTEGER DEFAULT (CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)),
+        completed_at INTEGER
+    )
+"""
+
+def _now_ms() -> int:
+    """Return the current time in epoch milliseconds."""
+    return int(time.time() * 1000)
+
+def _where_clause(has_status: bool, has_source: bool) -> str:
+    """Return the WHERE clause for a combination of listing filters."""
+    conditions = []
+    if has_status:
+        conditions.append("download_status = ?")
+    if has_source:
+        conditions.append("source_type = ?")
+    return f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+# SQL text is built once per filter combination, keyed by (has_status,
+# has_source). Reusing byte-identical statements lets SQLite's per-connection
+# statement cache skip re-parsing them.
+_FILTER_SHAPES = [(status, source) for status in (False, True) for source in (False, True)]
+
+# Display-ready timestamps, formatted by SQLite rather than per row in Python
+_FORMATTED_TIMESTAMPS = (
+    "strftime('%Y-%m-%d %H:%M:%S', downloads.created_at / 1000, 'unixepoch', 'localtime') AS created_at_formatted, "
+    "strftime('%Y-%m-%d %H:%M:%S', downloads.completed_at / 1000, 'unixepoch', 'localtime') AS completed_at_formatted"
+)
+
+# Every column of the downloads table, for validating caller-supplied lists
+_DOWNLOAD_COLUMNS = frozenset({
+    'id', 'filename', 'original_url', 'source_type', 'file_size', 'file_path',
+    'artist', 'track_name', 'search_query', 'spotify_track_id',
+    'download_status', 'error_message', 'created_at', 'completed_at',
+})
+
+# What the history page renders; listings skip the other columns by default
+DEFAULT_COLUMNS = (
+    'id', 'filename', 'source_type', 'artist', 'track_name', 'file_size',
+    'download_status', 'created_at', 'completed_at',
+)
+
+@functools.lru_cache(maxsize=None)
+def _list_sql(columns: Tuple[str, ...], has_status: bool, has_source: bool) -> str:
+    """Return the listing SQL for a column list and filter combination."""
+    return (f"SELECT {', '.join(columns)}, {_FORMATTED_TIMESTAMPS} "
+            f"FROM downloads{_where_clause(has_status, has_source)} "
+            "ORDER BY created_at DESC LIMIT ? OFFSET ?")
+
+_COUNT_SQL = {
+    shape: f"SELECT COUNT(*) FROM downloads{_where_clause(*shape)}"
+    for shape in _FILTER_SHAPES
+}
+
+# Running counters kept in the single-row download_totals table: column ->
+# a row's contribution, where {r} is NEW, OLD or the downloads table itself.
+# IS (rather than =) keeps a NULL status or source from turning a sum NULL.
+_TOTALS_COLUMNS = {
+    'total_count': "1",
+    'completed_count': "({r}.download_status IS 'completed')",
+    'failed_count': "({r}.download_status IS 'failed')",
+    'processing_count': "({r}.download_status IS 'processing')",
+    'playlist_count': "({r}.source_type IS 'playlist')",
+    'manual_count': "({r}.source_type IS 'manual')",
+    'total_size': "(CASE WHEN {r}.download_status IS 'completed' THEN COALESCE({r}.file_size, 0) ELSE 0 END)",
+}
+
+def _totals_update(add: str = None, subtract: str = None) -> str:
+    """Return an UPDATE that applies one row's change to download_totals.
+    
+    Args:
+        add: Row alias whose contribution is added ('new')
+        subtract: Row alias whose contribution is removed ('old')
+    
+    Returns:
+        UPDATE statement for use inside a trigger body
+    """
+    assignments = []
+    for column, expr in _TOTALS_COLUMNS.items():
+        delta = ""
+        if subtract:
+            delta += f" - {expr.format(r=subtract)}"
+        if add:
+            delta += f" + {expr.format(r=add)}"
+        assignments.append(f"{column} = {column}{delta}")
+    return f"UPDATE download_totals SET {', '.join(assignments)} WHERE id = 1"
+
 class DatabaseService:
     """Manages SQLite database operations for download tracking."""
     
     def __init__(self):
         """Initialize database service."""
         self.db_path = Path("audio_fetcher.db")  # Store in project root
-        # Ensure downloads directory exists for other purposes
-        Config.DOWNLOAD_PATH.mkdir(parents=True, exist_ok=True)
+        self._db: Optional[aiosqlite.Connection] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._connect_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+    
+    async def _get_db(self) -> aiosqlite.Connection:
+        """Return the shared connection, opening it on first use.
+        
+        Returns:
+            Long-lived aiosqlite connection
+        """
+        if self._db is None:
+            async with self._connect_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.db_path)
+                    db.row_factory = aiosqlite.Row
+                    # WAL + NORMAL turns each commit into a small log append
+                    # and lets readers proceed while a write is in flight
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA synchronous=NORMAL")
+                    await db.execute("PRAGMA temp_store=MEMORY")
+                    await db.execute("PRAGMA mmap_size=268435456")
+                    self._db = db
+        return self._db
+    
+    async def _open_readers(self) -> asyncio.Queue:
+        """Return the pool of read-only connections, opening it on first use.
+        
+        Returns:
+            Queue holding the idle read-only connections
+        """
+        if self._readers is None:
+            # The writer creates the file and sets WAL mode before readers open it
+            await self._get_db()
+            async with self._connect_lock:
+                if self._readers is None:
+                    readers = asyncio.Queue()
+                    for _ in range(_READ_POOL_SIZE):
+                        reader = await aiosqlite.connect(f"file:{self.db_path}?mode=ro", uri=True)
+                        reader.row_factory = aiosqlite.Row
+                        await reader.execute("PRAGMA temp_store=MEMORY")
+                        await reader.execute("PRAGMA mmap_size=268435456")
+                        readers.put_nowait(reader)
+                    self._readers = readers
+        return self._readers
+    
+    @contextlib.asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool for one query.
+        
+        Yields:
+            Read-only aiosqlite connection
+        """
+        readers = await self._open_readers()
+        reader = await readers.get()
+        try:
+            yield reader
+        finally:
+            if readers is self._readers:
+                readers.put_nowait(reader)
+            else:
+                # aclose() retired the pool while this connection was lent out
+                await reader.close()
+    
+    async def aclose(self):
+        """Close the shared database connection and the read pool.
+        
+        Idle readers are closed here; any still lent out are closed by
+        _reader() when their query finishes.
+        """
+        if self._readers is not None:
+            readers, self._readers = self._readers, None
+            while not readers.empty():
+                await readers.get_nowait().close()
+        
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+            logger.info("Database connection closed")
         
     async def initialize(self):
         """Initialize the database and create tables if they don't exist."""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            db = await self._get_db()
+            async with self._write_lock:
+                await db.execute(_DOWNLOADS_TABLE_SQL.format(table='downloads'))
+                await self._migrate_timestamps(db)
+                
+                await db.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_downloads_created_at 
+                    ON downloads(created_at DESC)
+                """)
+                
+                # Composite indexes let the filtered listings read rows in
+                # created_at order straight from the index, with no sort step
+                await db.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_downloads_filter_sort 
+                    ON downloads(download_status, source_type, created_at DESC)
+                """)
+                
                 await db.execute("""
-                    CREATE TABLE IF NOT EXISTS downloads (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        filename TEXT NOT NULL,
-                        original_url TEXT,
-                        source_type TEXT,  -- 'playlist' or 'manual'
-                        file_size INTEGER,
-                        file_path TEXT,
-                        artist TEXT,
-                        track_name TEXT,
-                        search_query TEXT,
-                        spotify_track_id TEXT,
-                        download_status TEXT,  -- 'completed', 'failed', 'processing'
-                        error_message TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        completed_at TIMESTAMP
+                    CREATE INDEX IF NOT EXISTS idx_downloads_status_created 
+                    ON downloads(download_status, created_at DESC)
+                """)
+                
+                await db.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_downloads_source_created 
+                    ON downloads(source_type, created_at DESC)
+                """)
+                
+                # Superseded by the composite indexes above
+                await db.execute("DROP INDEX IF EXISTS idx_downloads_status")
+                await db.execute("DROP INDEX IF EXISTS idx_downloads_source")
+                
+                # Full-text index over the searchable columns, kept in sync by triggers
+                async with db.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'downloads_fts'"
+                ) as cursor:
+                    fts_exists = await cursor.fetchone() is not None
+                
+                await db.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS downloads_fts USING fts5(
+                        filename, artist, track_name, search_query,
+                        content='downloads', content_rowid='id'
                     )
                 """)
                 
                 await db.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_downloads_created_at 
-                    ON downloads(created_at DESC)
+                    CREATE TRIGGER IF NOT EXISTS downloads_fts_insert AFTER INSERT ON downloads BEGIN
+                        INSERT INTO downloads_fts(rowid, filename, artist, track_name, search_query)
+                        VALUES (new.id, new.filename, new.artist, new.track_name, new.search_query);
+                    END
                 """)
                 
                 await db.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_downloads_status 
-                    ON downloads(download_status)
+                    CREATE TRIGGER IF NOT EXISTS downloads_fts_delete AFTER DELETE ON downloads BEGIN
+                        INSERT INTO downloads_fts(downloads_fts, rowid, filename, artist, track_name, search_query)
+                        VALUES ('delete', old.id, old.filename, old.artist, old.track_name, old.search_query);
+                    END
                 """)
                 
                 await db.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_downloads_source 
-                    ON downloads(source_type)
+                    CREATE TRIGGER IF NOT EXISTS downloads_fts_update
+                    AFTER UPDATE OF filename, artist, track_name, search_query ON downloads BEGIN
+                        INSERT INTO downloads_fts(downloads_fts, rowid, filename, artist, track_name, search_query)
+                        VALUES ('delete', old.id, old.filename, old.artist, old.track_name, old.search_query);
+                        INSERT INTO downloads_fts(rowid, filename, artist, track_name, search_query)
+                        VALUES (new.id, new.filename, new.artist, new.track_name, new.search_query);
+                    END
                 """)
                 
+                if not fts_exists:
+                    # Index rows that were recorded before the FTS table existed
+                    await db.execute("INSERT INTO downloads_fts(downloads_fts) VALUES ('rebuild')")
+                
+                await self._create_totals(db)
+                
                 await db.commit()
                 logger.info("Database initialized successfully")
                 
@@ -63,6 +289,83 @@ class DatabaseService:
             logger.error(f"Error initializing database: {e}")
             raise
     
+    async def _create_totals(self, db: aiosqlite.Connection):
+        """Create the download_totals row and the triggers that maintain it.
+        
+        Args:
+            db: Open database connection
+        """
+        async with db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'download_totals'"
+        ) as cursor:
+            totals_exist = await cursor.fetchone() is not None
+        
+        columns = ', '.join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in _TOTALS_COLUMNS)
+        await db.execute(f"""
+            CREATE TABLE IF NOT EXISTS download_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                {columns}
+            )
+        """)
+        
+        if not totals_exist:
+            # Seed the counters from rows recorded before the table existed
+            sums = ', '.join(
+                f"COALESCE(SUM({expr.format(r='downloads')}), 0)" for expr in _TOTALS_COLUMNS.values()
+            )
+            await db.execute(f"""
+                INSERT INTO download_totals (id, {', '.join(_TOTALS_COLUMNS)})
+                SELECT 1, {sums} FROM downloads
+            """)
+        
+        await db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS download_totals_insert AFTER INSERT ON downloads BEGIN
+                {_totals_update(add='new')};
+            END
+        """)
+        
+        await db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS download_totals_delete AFTER DELETE ON downloads BEGIN
+                {_totals_update(subtract='old')};
+            END
+        """)
+        
+        await db.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS download_totals_update
+            AFTER UPDATE OF download_status, source_type, file_size ON downloads BEGIN
+                {_totals_update(add='new', subtract='old')};
+            END
+        """)
+    
+    async def _migrate_timestamps(self, db: aiosqlite.Connection):
+        """Convert ISO-string timestamps from older databases to epoch milliseconds.
+        
+        Args:
+            db: Open database connection
+        """
+        async with db.execute("PRAGMA table_info(downloads)") as cursor:
+            column_types = {row['name']: row['type'] async for row in cursor}
+        
+        if column_types.get('created_at') == 'INTEGER':
+            return
+        
+        logger.info("Migrating download timestamps to epoch milliseconds...")
+        # Old values were written with datetime.now(), i.e. local time
+        await db.executescript(f"""
+            BEGIN;
+            {_DOWNLOADS_TABLE_SQL.format(table='downloads_migrated')};
+            INSERT INTO downloads_migrated
+            SELECT id, filename, original_url, source_type, file_size, file_path,
+                   artist, track_name, search_query, spotify_track_id,
+                   download_status, error_message,
+                   CAST((julianday(created_at, 'utc') - 2440587.5) * 86400000 AS INTEGER),
+                   CAST((julianday(completed_at, 'utc') - 2440587.5) * 86400000 AS INTEGER)
+            FROM downloads;
+            DROP TABLE downloads;
+            ALTER TABLE downloads_migrated RENAME TO downloads;
+            COMMIT;
+        """)
+    
     async def add_download(self, 
                           filename: str,
                           original_url: str = None,
@@ -86,14 +389,15 @@ class DatabaseService:
             Database ID of the created record
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            db = await self._get_db()
+            async with self._write_lock:
                 cursor = await db.execute("""
                     INSERT INTO downloads 
                     (filename, original_url, source_type, artist, track_name, 
                      search_query, spotify_track_id, download_status, created_at)
                     VALUES (?, ?, ?, ?, ?, ?, ?, 'processing', ?)
                 """, (filename, original_url, source_type, artist, track_name,
-                      search_query, spotify_track_id, datetime.now().isoformat()))
+                      search_query, spotify_track_id, _now_ms()))
                 
                 download_id = cursor.lastrowid
                 await db.commit()
@@ -104,7 +408,125 @@ class DatabaseService:
         except Exception as e:
             logger.error(f"Error adding download record: {e}")
             raise
-    
+
+    async def add_downloads_bulk(self, rows: List[Dict]) -> List[int]:
+        """Add several download records in a single transaction.
+
+        Args:
+            rows: Dictionaries with the same keys as add_download's arguments
+
+        Returns:
+            Database IDs of the created records, in input order
+        """
+        if not rows:
+            return []
+
+        try:
+            created_at = _now_ms()
+            params = [
+                (row['filename'], row.get('original_url'), row.get('source_type', 'manual'),
+                 row.get('artist'), row.get('track_name'), row.get('search_query'),
+                 row.get('spotify_track_id'), created_at)
+                for row in rows
+            ]
+
+            db = await self._get_db()
+            async with self._write_lock:
+                await db.executemany("""
+                    INSERT INTO downloads
+                    (filename, original_url, source_type, artist, track_name,
+                     search_query, spotify_track_id, download_status, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 'processing', ?)
+                """, params)
+
+                # Rows inserted by one statement under the write lock get consecutive IDs
+                async with db.execute("SELECT last_insert_rowid()") as cursor:
+                    last_id = (await cursor.fetchone())[0]
+                await db.commit()
+
+            first_id = last_id - len(rows) + 1
+            logger.info(f"Added {len(rows)} download records (IDs: {first_id}-{last_id})")
+            return list(range(first_id, last_id + 1))
+
+        except Exception as e:
+            logger.error(f"Error adding download records: {e}")
+            raise
+
+    async def delete_downloads(self, download_ids: List[int]):
+        """Delete several download records in a single transaction.
+        
+        Args:
+            download_ids: Database IDs of the records to delete
+        """
+        if not download_ids:
+            return
+        
+        try:
+            db = await self._get_db()
+            async with self._write_lock:
+                await db.executemany(
+                    "DELETE FROM downloads WHERE id = ?",
+                    [(download_id,) for download_id in download_ids]
+                )
+                await db.commit()
+                logger.info(f"Deleted {len(download_ids)} download records")
+                
+        except Exception as e:
+            logger.error(f"Error deleting download records: {e}")
+
+    async def record_completed_download(self,
+                                        filename: str,
+                                        file_path: str,
+                                        file_size: int,
+                                        original_url: str = None,
+                                        source_type: str = 'manual',
+                                        artist: str = None,
+                                        track_name: str = None,
+                                        search_query: str = None,
+                                        spotify_track_id: str = None) -> int:
+        """Add a record for a download that has already finished.
+        
+        Use this instead of add_download + update_download_success when the
+        outcome is known before anything needs to be written; it costs a
+        single INSERT and commit.
+        
+        Args:
+            filename: Name of the downloaded file
+            file_path: Path to the downloaded file
+            file_size: Size of the downloaded file in bytes
+            original_url: Original URL that was downloaded
+            source_type: 'playlist' or 'manual'
+            artist: Artist name
+            track_name: Track name
+            search_query: Search query used (for playlist downloads)
+            spotify_track_id: Spotify track ID (for playlist downloads)
+        
+        Returns:
+            Database ID of the created record
+        """
+        try:
+            now = _now_ms()
+            db = await self._get_db()
+            async with self._write_lock:
+                cursor = await db.execute("""
+                    INSERT INTO downloads 
+                    (filename, original_url, source_type, artist, track_name,
+                     search_query, spotify_track_id, file_path, file_size,
+                     download_status, created_at, completed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 'completed', ?, ?)
+                """, (filename, original_url, source_type, artist, track_name,
+                      search_query, spotify_track_id, file_path, file_size, now, now))
+                
+                download_id = cursor.lastrowid
+                await db.commit()
+                
+                logger.info(f"Recorded completed download: {filename} (ID: {download_id})")
+                return download_id
+                
+        except Exception as e:
+            logger.error(f"Error recording completed download: {e}")
+            raise
+
     async def update_download_success(self, 
                                     download_id: int,
                                     file_path: str,
@@ -117,7 +539,8 @@ class DatabaseService:
             file_size: Size of the downloaded file in bytes
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            db = await self._get_db()
+            async with self._write_lock:
                 await db.execute("""
                     UPDATE downloads 
                     SET download_status = 'completed',
@@ -125,7 +548,7 @@ class DatabaseService:
                         file_size = ?,
                         completed_at = ?
                     WHERE id = ?
-                """, (file_path, file_size, datetime.now().isoformat(), download_id))
+                """, (file_path, file_size, _now_ms(), download_id))
                 
                 await db.commit()
                 logger.info(f"Updated download record {download_id} as completed")
@@ -143,14 +566,15 @@ class DatabaseService:
             error_message: Error message describing the failure
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            db = await self._get_db()
+            async with self._write_lock:
                 await db.execute("""
                     UPDATE downloads 
                     SET download_status = 'failed',
                         error_message = ?,
                         completed_at = ?
                     WHERE id = ?
-                """, (error_message, datetime.now().isoformat(), download_id))
+                """, (error_message, _now_ms(), download_id))
                 
                 await db.commit()
                 logger.info(f"Updated download record {download_id} as failed")
@@ -170,7 +594,8 @@ class DatabaseService:
             track_name: Track name to set
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            db = await self._get_db()
+            async with self._write_lock:
                 await db.execute("""
                     UPDATE downloads 
                     SET artist = ?, track_name = ?
@@ -188,7 +613,8 @@ class DatabaseService:
                                limit: int = None,
                                offset: int = 0,
                                status_filter: str = None,
-                               source_filter: str = None) -> List[Dict]:
+                               source_filter: str = None,
+                               columns: Tuple[str, ...] = DEFAULT_COLUMNS) -> List[Dict]:
         """Get all downloads from the database.
         
         Args:
@@ -196,47 +622,27 @@ class DatabaseService:
             offset: Number of records to skip
             status_filter: Filter by download status ('completed', 'failed', 'processing')
             source_filter: Filter by source type ('playlist', 'manual')
+            columns: Columns to select (formatted timestamps are always added)
         
         Returns:
             List of download records as dictionaries
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                
-                # Build query with filters
-                query = "SELECT * FROM downloads WHERE 1=1"
-                params = []
-                
-                if status_filter:
-                    query += " AND download_status = ?"
-                    params.append(status_filter)
-                
-                if source_filter:
-                    query += " AND source_type = ?"
-                    params.append(source_filter)
-                
-                query += " ORDER BY created_at DESC"
-                
-                if limit:
-                    query += " LIMIT ? OFFSET ?"
-                    params.extend([limit, offset])
+            columns = tuple(columns)
+            unknown = set(columns) - _DOWNLOAD_COLUMNS
+            if unknown:
+                raise ValueError(f"Unknown download columns: {', '.join(sorted(unknown))}")
+            
+            query = _list_sql(columns, bool(status_filter), bool(source_filter))
+            params = self._filter_params(status_filter, source_filter)
+            # A negative LIMIT means "no limit" in SQLite
+            params.extend([limit or -1, offset if limit else 0])
+            
+            # Rows become dicts in the same pass that reads them, and the
+            # pooled connection is returned as soon as the list is built
+            async with self._reader() as db, db.execute(query, params) as cursor:
+                return [dict(row) async for row in cursor]
                 
-                async with db.execute(query, params) as cursor:
-                    rows = await cursor.fetchall()
-                    
-                    downloads = []
-                    for row in rows:
-                        download = dict(row)
-                        # Convert timestamps to more readable format
-                        if download['created_at']:
-                            download['created_at_formatted'] = self._format_timestamp(download['created_at'])
-                        if download['completed_at']:
-                            download['completed_at_formatted'] = self._format_timestamp(download['completed_at'])
-                        downloads.append(download)
-                    
-                    return downloads
-                    
         except Exception as e:
             logger.error(f"Error getting downloads: {e}")
             return []
@@ -248,110 +654,116 @@ class DatabaseService:
             Dictionary with download statistics
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Total downloads
-                async with db.execute("SELECT COUNT(*) FROM downloads") as cursor:
-                    total = (await cursor.fetchone())[0]
-                
-                # Completed downloads
-                async with db.execute("SELECT COUNT(*) FROM downloads WHERE download_status = 'completed'") as cursor:
-                    completed = (await cursor.fetchone())[0]
-                
-                # Failed downloads
-                async with db.execute("SELECT COUNT(*) FROM downloads WHERE download_status = 'failed'") as cursor:
-                    failed = (await cursor.fetchone())[0]
-                
-                # Processing downloads
-                async with db.execute("SELECT COUNT(*) FROM downloads WHERE download_status = 'processing'") as cursor:
-                    processing = (await cursor.fetchone())[0]
-                
-                # Playlist vs manual downloads
-                async with db.execute("SELECT COUNT(*) FROM downloads WHERE source_type = 'playlist'") as cursor:
-                    playlist_downloads = (await cursor.fetchone())[0]
-                
-                async with db.execute("SELECT COUNT(*) FROM downloads WHERE source_type = 'manual'") as cursor:
-                    manual_downloads = (await cursor.fetchone())[0]
-                
-                # Total file size
-                async with db.execute("SELECT SUM(file_size) FROM downloads WHERE download_status = 'completed'") as cursor:
-                    total_size = (await cursor.fetchone())[0] or 0
-                
-                return {
-                    'total_downloads': total,
-                    'completed_downloads': completed,
-                    'failed_downloads': failed,
-                    'processing_downloads': processing,
-                    'playlist_downloads': playlist_downloads,
-                    'manual_downloads': manual_downloads,
-                    'total_file_size': total_size,
-                    'success_rate': (completed / total * 100) if total > 0 else 0
-                }
-                
+            # download_totals is kept current by triggers, so this is one row
+            async with self._reader() as db, db.execute("SELECT * FROM download_totals WHERE id = 1") as cursor:
+                row = await cursor.fetchone()
+            
+            total = row['total_count']
+            completed = row['completed_count']
+            
+            return {
+                'total_downloads': total,
+                'completed_downloads': completed,
+                'failed_downloads': row['failed_count'],
+                'processing_downloads': row['processing_count'],
+                'playlist_downloads': row['playlist_count'],
+                'manual_downloads': row['manual_count'],
+                'total_file_size': row['total_size'],
+                'success_rate': (completed / total * 100) if total > 0 else 0
+            }
+            
         except Exception as e:
             logger.error(f"Error getting download stats: {e}")
             return {}
     
     async def search_downloads(self, 
                               search_term: str,
-                              limit: int = 50) -> List[Dict]:
+                              limit: int = 50,
+                              offset: int = 0) -> List[Dict]:
         """Search downloads by filename, artist, or track name.
         
         Args:
             search_term: Term to search for
             limit: Maximum number of results to return
+            offset: Number of results to skip
         
         Returns:
             List of matching download records
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                
-                query = """
-                    SELECT * FROM downloads 
-                    WHERE filename LIKE ? 
-                       OR artist LIKE ? 
-                       OR track_name LIKE ?
-                       OR search_query LIKE ?
-                    ORDER BY created_at DESC
-                    LIMIT ?
-                """
-                
-                search_pattern = f"%{search_term}%"
-                params = [search_pattern, search_pattern, search_pattern, search_pattern, limit]
+            match_query = self._build_match_query(search_term)
+            if not match_query:
+                return []
+            
+            query = f"""
+                SELECT downloads.*, {_FORMATTED_TIMESTAMPS} FROM downloads_fts
+                JOIN downloads ON downloads.id = downloads_fts.rowid
+                WHERE downloads_fts MATCH ?
+                ORDER BY downloads_fts.rank
+                LIMIT ? OFFSET ?
+            """
+            params = [match_query, limit, offset]
+            
+            async with self._reader() as db, db.execute(query, params) as cursor:
+                return [dict(row) async for row in cursor]
                 
-                async with db.execute(query, params) as cursor:
-                    rows = await cursor.fetchall()
-                    
-                    downloads = []
-                    for row in rows:
-                        download = dict(row)
-                        if download['created_at']:
-                            download['created_at_formatted'] = self._format_timestamp(download['created_at'])
-                        if download['completed_at']:
-                            download['completed_at_formatted'] = self._format_timestamp(download['completed_at'])
-                        downloads.append(download)
-                    
-                    return downloads
-                    
         except Exception as e:
             logger.error(f"Error searching downloads: {e}")
             return []
     
-    def _format_timestamp(self, timestamp_str: str) -> str:
-        """Format timestamp string for display.
+    async def get_search_count(self, search_term: str) -> int:
+        """Get the number of downloads matching a search.
         
         Args:
-            timestamp_str: ISO timestamp string
+            search_term: Term to search for
         
         Returns:
-            Formatted timestamp string
+            Number of records search_downloads would return without a limit
         """
         try:
-            dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-            return dt.strftime('%Y-%m-%d %H:%M:%S')
-        except:
-            return timestamp_str
+            match_query = self._build_match_query(search_term)
+            if not match_query:
+                return 0
+            
+            query = "SELECT COUNT(*) FROM downloads_fts WHERE downloads_fts MATCH ?"
+            async with self._reader() as db, db.execute(query, [match_query]) as cursor:
+                return (await cursor.fetchone())[0]
+                
+        except Exception as e:
+            logger.error(f"Error getting search count: {e}")
+            return 0
+    
+    def _filter_params(self, status_filter: Optional[str], source_filter: Optional[str]) -> list:
+        """Collect bind parameters in the order used by _list_sql/_COUNT_SQL.
+        
+        Args:
+            status_filter: Download status filter, if any
+            source_filter: Source type filter, if any
+        
+        Returns:
+            List of bind parameters for the active filters
+        """
+        params = []
+        if status_filter:
+            params.append(status_filter)
+        if source_filter:
+            params.append(source_filter)
+        return params
+    
+    def _build_match_query(self, search_term: str) -> str:
+        """Build an FTS5 MATCH expression from free-form user input.
+        
+        Every word becomes a quoted prefix term, so user input can't inject
+        FTS query syntax and partial words still match.
+        
+        Args:
+            search_term: Raw search input
+        
+        Returns:
+            MATCH expression, or an empty string if the input has no words
+        """
+        words = re.findall(r'\w+', search_term)
+        return ' '.join(f'"{word}"*' for word in words)
     
     async def get_count(self, status_filter: str = None, source_filter: str = None) -> int:
         """Get total count of downloads with optional filters.
@@ -364,21 +776,12 @@ class DatabaseService:
             Total count of matching downloads
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                query = "SELECT COUNT(*) FROM downloads WHERE 1=1"
-                params = []
-                
-                if status_filter:
-                    query += " AND download_status = ?"
-                    params.append(status_filter)
-                
-                if source_filter:
-                    query += " AND source_type = ?"
-                    params.append(source_filter)
+            query = _COUNT_SQL[bool(status_filter), bool(source_filter)]
+            params = self._filter_params(status_filter, source_filter)
+            
+            async with self._reader() as db, db.execute(query, params) as cursor:
+                return (await cursor.fetchone())[0]
                 
-                async with db.execute(query, params) as cursor:
-                    return (await cursor.fetchone())[0]
-                    
         except Exception as e:
             logger.error(f"Error getting download count: {e}")
             return 0
@@ -2,15 +2,57 @@
 
 import yt_dlp
 import asyncio
+import functools
 import logging
-import re
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Callable
+from typing import Optional, Dict, Callable, List
 from config import Config
+from .constants import FILENAME_ARTIFACT_RE, INVALID_FILENAME_CHARS
 from .metadata_service import MetadataService
 
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=512)
+def _sanitize(filename: str) -> str:
+    """Sanitize filename for filesystem compatibility (memoized).
+    
+    Args:
+        filename: Original filename
+    
+    Returns:
+        Sanitized filename
+    """
+    # Remove problematic characters
+    filename = filename.translate(INVALID_FILENAME_CHARS)
+    
+    # Remove YouTube-specific metadata patterns; every one of them is
+    # bracketed, so titles without brackets skip the regex entirely
+    if '[' in filename or '(' in filename:
+        filename = FILENAME_ARTIFACT_RE.sub('', filename)
+    
+    # Clean up extra spaces and trim
+    filename = ' '.join(filename.split()).strip()
+    
+    # Limit length
+    if len(filename) > 200:
+        filename = filename[:200].strip()
+    
+    return filename
+
+@functools.cache
+def _download_executor() -> ThreadPoolExecutor:
+    """Return the thread pool that runs yt-dlp, created on first use.
+    
+    Downloads can take minutes, so they get their own DOWNLOAD_CONCURRENCY
+    threads instead of tying up the default executor that the rest of the
+    app uses for short blocking calls.
+    """
+    return ThreadPoolExecutor(max_workers=Config.DOWNLOAD_CONCURRENCY,
+                              thread_name_prefix='yt-dlp')
+
 class DownloadService:
     """Manages audio downloads using yt-dlp."""
     
@@ -64,51 +106,19 @@ class DownloadService:
         Returns:
             Sanitized filename
         """
-        # Remove problematic characters
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            filename = filename.replace(char, '')
-        
-        # Remove YouTube-specific metadata patterns
-        youtube_patterns = [
-            r'\[Official\s*(Music\s*)?Video\]',
-            r'\(Official\s*(Music\s*)?Video\)',
-            r'\[Official\s*Audio\]',
-            r'\(Official\s*Audio\)',
-            r'\[Lyrics?\]',
-            r'\(Lyrics?\)',
-            r'\[HD\]',
-            r'\(HD\)',
-            r'\[4K\]',
-            r'\(4K\)',
-            r'\[Music\s*Video\]',
-            r'\(Music\s*Video\)',
-            r'\[Visualizer\]',
-            r'\(Visualizer\)',
-            r'\[Lyric\s*Video\]',
-            r'\(Lyric\s*Video\)',
-        ]
-        
-        for pattern in youtube_patterns:
-            filename = re.sub(pattern, '', filename, flags=re.IGNORECASE)
-        
-        # Clean up extra spaces and trim
-        filename = ' '.join(filename.split()).strip()
-        
-        # Limit length
-        if len(filename) > 200:
-            filename = filename[:200].strip()
-        
-        return filename
+        return _sanitize(filename)
     
     async def download_audio(self, url: str, custom_filename: Optional[str] = None, 
-                           progress_callback: Optional[Callable] = None) -> Dict:
+                           progress_callback: Optional[Callable] = None,
+                           metadata: Optional[Dict] = None) -> Dict:
         """Download audio from URL.
         
         Args:
             url: URL to download from
             custom_filename: Custom filename (without extension)
             progress_callback: Optional progress callback function
+            metadata: Tags to write (artist, title, album, year, genre, bpm)
+                instead of ones parsed from the filename
         
         Returns:
             Dictionary with download result information
@@ -122,13 +132,19 @@ class DownloadService:
                 'url': url,
                 'filename': None,
                 'filepath': None,
+                'file_size': 0,
                 'progress': 0,
                 'speed': None,
                 'eta': None,
                 'error': None
             }
             
+            # Progress ticks arrive once per network chunk; forward at most
+            # one every 200 ms to the callback
+            last_emit = 0.0
+            
             def progress_hook(d):
+                nonlocal last_emit
                 if d['status'] == 'downloading':
                     if 'total_bytes' in d:
                         download_info['progress'] = (d['downloaded_bytes'] / d['total_bytes']) * 100
@@ -140,7 +156,10 @@ class DownloadService:
                     download_info['status'] = 'downloading'
                     
                     if progress_callback:
-                        progress_callback(download_info.copy())
+                        now = time.monotonic()
+                        if now - last_emit >= 0.2:
+                            last_emit = now
+                            progress_callback(download_info.copy())
                 
                 elif d['status'] == 'finished':
                     download_info['status'] = 'processing'
@@ -153,10 +172,10 @@ class DownloadService:
             # Get yt-dlp options
             ydl_opts = self._get_ydl_opts(custom_filename, progress_hook)
             
-            # Run download in thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, 
+            # Run download in the download pool to avoid blocking; extra
+            # downloads wait there for a free thread
+            result = await asyncio.get_running_loop().run_in_executor(
+                _download_executor(),
                 self._download_with_ydlp, 
                 url, 
                 ydl_opts, 
@@ -166,10 +185,18 @@ class DownloadService:
             # If download was successful, set metadata (if enabled)
             if result['status'] == 'completed' and result.get('filepath') and Config.ENABLE_METADATA_TAGGING:
                 try:
-                    await self.set_file_metadata(result['filepath'])
+                    await self.set_file_metadata(result['filepath'], pre_cleaned=bool(custom_filename),
+                                                 **(metadata or {}))
                 except Exception as e:
                     logger.warning(f"Failed to set metadata after download: {e}")
             
+            # Size after tagging, so callers don't have to stat the file again
+            if result['status'] == 'completed' and result.get('filepath'):
+                try:
+                    result['file_size'] = os.path.getsize(result['filepath'])
+                except OSError as e:
+                    logger.warning(f"Could not read size of {result['filepath']}: {e}")
+            
             return result
             
         except Exception as e:
@@ -198,6 +225,9 @@ class DownloadService:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 # Extract info first
                 info = ydl.extract_info(url, download=False)
+                # Searches come back as a one-entry playlist
+                if info.get('_type') == 'playlist' and info.get('entries'):
+                    info = info['entries'][0]
                 title = info.get('title', 'Unknown')
                 
                 # Clean the title
@@ -207,18 +237,29 @@ class DownloadService:
                 # Download the audio
                 ydl.download([url])
                 
-                # Find the downloaded file
-                expected_path = self.download_path / download_info['filename']
-                if expected_path.exists():
-                    download_info['filepath'] = str(expected_path)
-                else:
-                    # Search for mp3 files with similar names
-                    possible_files = list(self.download_path.glob("*.mp3"))
-                    if possible_files:
-                        # Get the most recently created file
-                        latest_file = max(possible_files, key=lambda p: p.stat().st_mtime)
-                        download_info['filepath'] = str(latest_file)
-                        download_info['filename'] = latest_file.name
+                # The output template gives the downloaded name; the audio
+                # post-processor then swaps its extension for .mp3
+                final_path = Path(ydl.prepare_filename(info)).with_suffix('.mp3')
+                if not final_path.exists() and download_info['filepath']:
+                    # Fall back to the path reported by the 'finished' progress hook
+                    final_path = Path(download_info['filepath']).with_suffix('.mp3')
+                
+                if not final_path.exists():
+                    # Last resort: newest mp3 in the download folder. scandir's
+                    # entries carry their own stat info, so this is one
+                    # directory read rather than a stat() per file.
+                    with os.scandir(self.download_path) as entries:
+                        latest = max(
+                            (entry for entry in entries if entry.name.endswith('.mp3') and entry.is_file()),
+                            key=lambda entry: entry.stat().st_mtime,
+                            default=None
+                        )
+                    if latest is not None:
+                        final_path = Path(latest.path)
+                
+                if final_path.exists():
+                    download_info['filepath'] = str(final_path)
+                    download_info['filename'] = final_path.name
                 
                 download_info['status'] = 'completed'
                 download_info['progress'] = 100
@@ -238,7 +279,8 @@ class DownloadService:
                                album: str = None,
                                year: str = None,
                                genre: str = None,
-                               bpm: int = None) -> bool:
+                               bpm: int = None,
+                               pre_cleaned: bool = False) -> bool:
         """Set metadata tags on a downloaded file.
         
         Args:
@@ -249,6 +291,7 @@ class DownloadService:
             year: Release year
             genre: Music genre
             bpm: Beats per minute
+            pre_cleaned: True if the filename came from _sanitize_filename
         
         Returns:
             True if metadata was set successfully
@@ -256,7 +299,7 @@ class DownloadService:
         try:
             # If no metadata provided, try to extract from filename
             if not artist and not title:
-                extracted = self.metadata_service.extract_metadata_from_filename(Path(file_path).name)
+                extracted = self.metadata_service.extract_metadata_from_filename(Path(file_path).name, pre_cleaned)
                 artist = artist or extracted.get('artist')
                 title = title or extracted.get('title')
                 album = album or extracted.get('album')
@@ -276,9 +319,14 @@ class DownloadService:
                     logger.warning(f"BPM estimation failed: {e}")
                     bpm = None
             
+            # Open the file once and hand the parsed object to the metadata service
+            audiofile = self.metadata_service.load_audio_file(file_path)
+            if audiofile is None:
+                return False
+            
             # Set metadata using the metadata service
             success = await self.metadata_service.set_metadata(
-                file_path=file_path,
+                file_path=audiofile,
                 artist=artist,
                 title=title,
                 album=album,
@@ -299,13 +347,15 @@ class DownloadService:
             return False
     
     async def search_and_download(self, search_query: str, custom_filename: Optional[str] = None,
-                                progress_callback: Optional[Callable] = None) -> Dict:
+                                progress_callback: Optional[Callable] = None,
+                                metadata: Optional[Dict] = None) -> Dict:
         """Search YouTube and download the first result.
         
         Args:
             search_query: Search query string
             custom_filename: Custom filename (without extension)
             progress_callback: Optional progress callback function
+            metadata: Tags to write instead of ones parsed from the filename
         
         Returns:
             Dictionary with download result information
@@ -319,7 +369,8 @@ class DownloadService:
             return await self.download_audio(
                 search_url, 
                 custom_filename, 
-                progress_callback
+                progress_callback,
+                metadata
             )
             
         except Exception as e:
@@ -333,6 +384,57 @@ class DownloadService:
                 'progress': 0
             }
     
+    async def download_many(self, urls: List[str],
+                           progress_callback: Optional[Callable] = None) -> List[Dict]:
+        """Download several URLs concurrently.
+        
+        At most Config.DOWNLOAD_CONCURRENCY downloads run at the same time.
+        
+        Args:
+            urls: URLs to download from
+            progress_callback: Optional progress callback function
+        
+        Returns:
+            Download result dictionaries, in the same order as urls
+        """
+        semaphore = asyncio.Semaphore(Config.DOWNLOAD_CONCURRENCY)
+        
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(self._bounded_download(semaphore, url, progress_callback))
+                for url in urls
+            ]
+        
+        return [task.result() for task in tasks]
+    
+    async def _bounded_download(self, semaphore: asyncio.Semaphore, url: str,
+                                progress_callback: Optional[Callable] = None) -> Dict:
+        """Download a URL once a slot in the semaphore is free.
+        
+        Args:
+            semaphore: Semaphore limiting concurrent downloads
+            url: URL to download from
+            progress_callback: Optional progress callback function
+        
+        Returns:
+            Dictionary with download result information
+        """
+        async with semaphore:
+            return await self.download_audio(url, progress_callback=progress_callback)
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def _supported_sites_cached() -> tuple:
+        """Collect extractor names from yt-dlp once per process.
+        
+        Returns:
+            Tuple of supported extractor names
+        """
+        # Use the module-level function instead of instance method
+        from yt_dlp.extractor import list_extractors
+        extractors = list_extractors()
+        return tuple(extractor.IE_NAME for extractor in extractors if hasattr(extractor, 'IE_NAME'))
+    
     def get_supported_sites(self) -> list:
         """Get list of supported sites from yt-dlp.
         
@@ -340,10 +442,7 @@ class DownloadService:
             List of supported extractor names
         """
         try:
-            # Use the module-level function instead of instance method
-            from yt_dlp.extractor import list_extractors
-            extractors = list_extractors()
-            return [extractor.IE_NAME for extractor in extractors if hasattr(extractor, 'IE_NAME')]
+            return list(self._supported_sites_cached())
         except Exception as e:
             logger.error(f"Error getting supported sites: {e}")
             # Return a fallback list of popular platforms
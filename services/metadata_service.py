@@ -1,15 +1,38 @@
 """Metadata service for setting audio file tags."""
 
+import asyncio
+import functools
 import logging
 import re
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, Union
 from mutagen.mp3 import MP3
 from mutagen.id3 import ID3, TIT2, TPE1, TBPM, TALB, TYER, TCON, TPE2
-from mutagen import File as MutagenFile
+from mutagen import File as MutagenFile, FileType
+
+from .constants import ARTIFACT_RE, EXPLICIT_TAG_RE
 
 logger = logging.getLogger(__name__)
 
+# "Artist - Title" with a hyphen, en dash or em dash as the separator
+_ARTIST_TITLE_RE = re.compile(r'^(.+?)\s*[-–—]\s*(.+?)$')
+
+# "single" or "ep" as a standalone word, as in "Title - Single" or "Title (EP)"
+_SINGLE_EP_RE = re.compile(r'(?:^|[\s\-(\[])(single|ep)(?:[\s)\]]|$)', re.IGNORECASE)
+
+@functools.cache
+def _librosa():
+    """Import librosa on first use; it is slow to load and only needed for BPM."""
+    import librosa
+    return librosa
+
+def _fold(text: Optional[str]) -> str:
+    """Normalize text for caseless comparison."""
+    return text.casefold().strip() if text else ""
+
+# "Official", "VEVO" or "Music" suffix on a channel-style artist name
+_ARTIST_SUFFIX_RE = re.compile(r'\s*(Official|VEVO|Music)$', re.IGNORECASE)
+
 class MetadataService:
     """Handles setting metadata tags on downloaded audio files."""
     
@@ -17,8 +40,27 @@ class MetadataService:
         """Initialize metadata service."""
         pass
     
+    def load_audio_file(self, file_path: Union[str, Path]) -> Optional[FileType]:
+        """Open an audio file with mutagen so it can be shared between calls.
+        
+        Args:
+            file_path: Path to the audio file
+        
+        Returns:
+            Mutagen file object, or None if the file is missing or unsupported
+        """
+        file_path = Path(file_path)
+        if not file_path.exists():
+            logger.error(f"File does not exist: {file_path}")
+            return None
+        
+        audiofile = MutagenFile(str(file_path))
+        if audiofile is None:
+            logger.error(f"Could not load audio file: {file_path}")
+        return audiofile
+    
     async def set_metadata(self, 
-                          file_path: str,
+                          file_path: Union[str, Path, FileType],
                           artist: str = None,
                           title: str = None,
                           album: str = None,
@@ -28,7 +70,8 @@ class MetadataService:
         """Set metadata tags on an audio file.
         
         Args:
-            file_path: Path to the audio file
+            file_path: Path to the audio file, or a file already opened with
+                load_audio_file
             artist: Artist name
             title: Track title
             album: Album name
@@ -40,16 +83,13 @@ class MetadataService:
             True if metadata was set successfully, False otherwise
         """
         try:
-            file_path = Path(file_path)
-            if not file_path.exists():
-                logger.error(f"File does not exist: {file_path}")
-                return False
-            
-            # Load the audio file
-            audiofile = MutagenFile(str(file_path))
+            # Load the audio file unless the caller already has it open
+            if isinstance(file_path, FileType):
+                audiofile = file_path
+            else:
+                audiofile = self.load_audio_file(file_path)
             
             if audiofile is None:
-                logger.error(f"Could not load audio file: {file_path}")
                 return False
             
             # Handle MP3 files specifically
@@ -79,6 +119,12 @@ class MetadataService:
         Returns:
             True if successful, False otherwise
         """
+        # Nothing to write, so leave the file untouched
+        if not any((title, artist, album, year, genre, bpm)):
+            return True
+        
+        title_lower = _fold(title)
+        
         try:
             # Initialize ID3 tags if they don't exist
             if audiofile.tags is None:
@@ -95,7 +141,7 @@ class MetadataService:
                 audiofile.tags.add(TPE2(encoding=3, text=artist))
             
             # Set album (only if it's a valid album name)
-            if album and self._is_valid_album(album, title):
+            if album and self._is_valid_album(album, title_lower=title_lower):
                 audiofile.tags.add(TALB(encoding=3, text=album))
             
             # Set year
@@ -135,6 +181,12 @@ class MetadataService:
         Returns:
             True if successful, False otherwise
         """
+        # Nothing to write, so leave the file untouched
+        if not any((title, artist, album, year, genre, bpm)):
+            return True
+        
+        title_lower = _fold(title)
+        
         try:
             # Set title
             if title:
@@ -146,7 +198,7 @@ class MetadataService:
                 audiofile['ALBUMARTIST'] = artist
             
             # Set album (only if it's a valid album name)
-            if album and self._is_valid_album(album, title):
+            if album and self._is_valid_album(album, title_lower=title_lower):
                 audiofile['ALBUM'] = album
             
             # Set year/date
@@ -170,11 +222,13 @@ class MetadataService:
             logger.error(f"Error setting generic metadata: {e}")
             return False
     
-    def extract_metadata_from_filename(self, filename: str) -> Dict[str, str]:
+    def extract_metadata_from_filename(self, filename: str, pre_cleaned: bool = False) -> Dict[str, str]:
         """Extract artist and title from filename.
         
         Args:
             filename: The filename to parse
+            pre_cleaned: True if the name already went through
+                DownloadService._sanitize_filename, so only explicit tags remain
         
         Returns:
             Dictionary with extracted metadata
@@ -184,35 +238,28 @@ class MetadataService:
             name_without_ext = Path(filename).stem
             
             # Common patterns for "Artist - Title"
-            patterns = [
-                r'^(.+?)\s*-\s*(.+?)$',  # "Artist - Title"
-                r'^(.+?)\s*–\s*(.+?)$',  # "Artist – Title" (em dash)
-                r'^(.+?)\s*—\s*(.+?)$',  # "Artist — Title" (em dash)
-            ]
-            
-            for pattern in patterns:
-                match = re.match(pattern, name_without_ext.strip())
-                if match:
-                    artist = match.group(1).strip()
-                    title = match.group(2).strip()
-                    
-                    # Clean up common artifacts
-                    title = self._clean_title(title)
-                    artist = self._clean_artist(artist)
-                    
-                    return {
-                        'artist': artist,
-                        'title': title,
-                        'album': '',  # We don't typically extract album from filename
-                        'year': '',
-                        'genre': '',
-                        'bpm': None
-                    }
+            match = _ARTIST_TITLE_RE.match(name_without_ext.strip())
+            if match:
+                artist = match.group(1).strip()
+                title = match.group(2).strip()
+                
+                # Clean up common artifacts
+                title = self._clean_title(title, pre_cleaned)
+                artist = self._clean_artist(artist)
+                
+                return {
+                    'artist': artist,
+                    'title': title,
+                    'album': '',  # We don't typically extract album from filename
+                    'year': '',
+                    'genre': '',
+                    'bpm': None
+                }
             
             # If no pattern matches, treat the whole filename as title
             return {
                 'artist': '',
-                'title': self._clean_title(name_without_ext),
+                'title': self._clean_title(name_without_ext, pre_cleaned),
                 'album': '',
                 'year': '',
                 'genre': '',
@@ -230,40 +277,25 @@ class MetadataService:
                 'bpm': None
             }
     
-    def _clean_title(self, title: str) -> str:
+    def _clean_title(self, title: str, pre_cleaned: bool = False) -> str:
         """Clean up title by removing common artifacts.
         
         Args:
             title: Title to clean
+            pre_cleaned: The title came from _sanitize_filename, so only the
+                explicit tags it keeps are left to strip
         
         Returns:
             Cleaned title
         """
         # Remove common YouTube/video artifacts
-        artifacts = [
-            r'\[Official\s*(Music\s*)?Video\]',
-            r'\(Official\s*(Music\s*)?Video\)',
-            r'\[Official\s*Audio\]',
-            r'\(Official\s*Audio\)',
-            r'\[Lyrics?\]',
-            r'\(Lyrics?\)',
-            r'\[HD\]',
-            r'\(HD\)',
-            r'\[4K\]',
-            r'\(4K\)',
-            r'\[Music\s*Video\]',
-            r'\(Music\s*Video\)',
-            r'\[Visualizer\]',
-            r'\(Visualizer\)',
-            r'\[Lyric\s*Video\]',
-            r'\(Lyric\s*Video\)',
-            r'\[Explicit\]',
-            r'\(Explicit\)',
-        ]
-        
-        cleaned_title = title
-        for artifact in artifacts:
-            cleaned_title = re.sub(artifact, '', cleaned_title, flags=re.IGNORECASE)
+        # (all of them are bracketed, so titles without brackets are skipped)
+        if '[' not in title and '(' not in title:
+            cleaned_title = title
+        elif pre_cleaned:
+            cleaned_title = EXPLICIT_TAG_RE.sub('', title)
+        else:
+            cleaned_title = ARTIFACT_RE.sub('', title)
         
         # Clean up extra spaces
         cleaned_title = ' '.join(cleaned_title.split())
@@ -283,16 +315,17 @@ class MetadataService:
         artist = artist.strip()
         
         # Remove "Official" or "VEVO" suffixes
-        artist = re.sub(r'\s*(Official|VEVO|Music)$', '', artist, flags=re.IGNORECASE)
+        artist = _ARTIST_SUFFIX_RE.sub('', artist)
         
         return artist.strip()
     
-    def _is_valid_album(self, album: str, title: str) -> bool:
+    def _is_valid_album(self, album: str, title: str = None, title_lower: Optional[str] = None) -> bool:
         """Check if the album name is a real album (not a single or generic name).
         
         Args:
             album: Album name to validate
             title: Track title for comparison
+            title_lower: Title already passed through _fold, used instead of title
         
         Returns:
             True if it's a valid album name, False otherwise
@@ -300,45 +333,37 @@ class MetadataService:
         if not album or not album.strip():
             return False
         
-        album_lower = album.lower().strip()
-        title_lower = title.lower().strip() if title else ""
+        album_lower = _fold(album)
+        if title_lower is None:
+            title_lower = _fold(title)
         
         # Skip if album contains single/EP indicators
-        single_indicators = [
-            '- single', ' single', 'single -', 'single)',
-            '- ep', ' ep', 'ep -', 'ep)',
-            '(single)', '[single]',
-            '(ep)', '[ep]'
-        ]
-        
-        for indicator in single_indicators:
-            if indicator in album_lower:
-                return False
+        if _SINGLE_EP_RE.search(album_lower):
+            return False
         
         # Skip if album is just the track title
         if title_lower and album_lower == title_lower:
             return False
         
-        # Skip if album is track title + common suffixes
-        if title_lower:
-            title_variants = [
-                f"{title_lower} - single",
-                f"{title_lower} single",
-                f"{title_lower} (single)",
-                f"{title_lower} [single]",
-                f"{title_lower} - ep",
-                f"{title_lower} ep",
-                f"{title_lower} (ep)",
-                f"{title_lower} [ep]"
-            ]
-            if album_lower in title_variants:
-                return False
-        
         return True
     
     async def estimate_bpm(self, file_path: str) -> Optional[int]:
         """Estimate BPM of an audio file using librosa.
         
+        The analysis is CPU-bound, so it runs in a worker thread to keep the
+        event loop responsive.
+        
+        Args:
+            file_path: Path to the audio file
+        
+        Returns:
+            Estimated BPM or None if detection fails
+        """
+        return await asyncio.to_thread(self._estimate_bpm_sync, file_path)
+    
+    def _estimate_bpm_sync(self, file_path: str) -> Optional[int]:
+        """Estimate BPM of an audio file using librosa (blocking).
+        
         Args:
             file_path: Path to the audio file
         
@@ -346,35 +371,29 @@ class MetadataService:
             Estimated BPM or None if detection fails
         """
         try:
-            import librosa
-            import numpy as np
+            librosa = _librosa()
             
             logger.info(f"Analyzing BPM for {file_path}...")
             
             # Load audio file with error handling
-            # Use a shorter duration for faster processing (30 seconds from the middle)
+            # Use a shorter duration for faster processing (30 seconds from the middle).
+            # Tempo only needs the low end of the spectrum, so decode to mono at
+            # 11.025 kHz with the fast soxr resampler.
             try:
-                y, sr = librosa.load(file_path, duration=30, offset=30)
+                y, sr = self._load_bpm_window(librosa, file_path, sr=11025, offset=30, duration=30)
             except Exception as load_error:
                 logger.warning(f"Failed to load audio file {file_path}: {load_error}")
                 return None
             
-            # Detect tempo/BPM with multiple methods for robustness
+            # Detect tempo from the autocorrelation of the onset envelope;
+            # unlike beat_track this skips the dynamic-programming beat pass
             try:
-                # Primary method: beat tracking
-                tempo, beats = librosa.beat.beat_track(y=y, sr=sr, hop_length=512)
-                
-                # If tempo seems unreasonable, try onset detection
-                if not (60 <= tempo <= 200):
-                    onset_frames = librosa.onset.onset_detect(y=y, sr=sr)
-                    if len(onset_frames) > 1:
-                        # Calculate average time between onsets
-                        onset_times = librosa.onset.onset_times_to_samples(onset_frames, sr=sr)
-                        avg_interval = np.mean(np.diff(onset_times)) / sr
-                        tempo = 60.0 / avg_interval if avg_interval > 0 else tempo
+                # hop_length=256 at 11.025 kHz keeps the ~23 ms frames of 512 at 22.05 kHz
+                onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=256)
+                tempo = librosa.feature.tempo(onset_envelope=onset_env, sr=sr, hop_length=256)[0]
                 
             except Exception as beat_error:
-                logger.warning(f"Beat tracking failed: {beat_error}")
+                logger.warning(f"Tempo estimation failed: {beat_error}")
                 return None
             
             # Round to nearest integer
@@ -395,17 +414,55 @@ class MetadataService:
             logger.warning(f"BPM detection failed for {file_path}: {e}")
             return None
     
-    def get_file_metadata(self, file_path: str) -> Dict:
-        """Get existing metadata from an audio file.
+    def _load_bpm_window(self, librosa, file_path: str, sr: int, offset: int, duration: int):
+        """Decode part of an audio file as mono float32 at the given rate.
+        
+        Reads the window straight through soundfile (libsndfile decodes MP3
+        natively) and resamples it once, falling back to librosa.load for
+        formats soundfile can't open.
         
         Args:
+            librosa: The librosa module
             file_path: Path to the audio file
+            sr: Target sample rate
+            offset: Start of the window in seconds
+            duration: Length of the window in seconds
+        
+        Returns:
+            Tuple of (samples, sample rate)
+        """
+        try:
+            import soundfile as sf
+            
+            with sf.SoundFile(file_path) as audio:
+                native_sr = audio.samplerate
+                audio.seek(min(offset * native_sr, audio.frames))
+                data = audio.read(frames=duration * native_sr, dtype='float32', always_2d=True)
+        except Exception as e:
+            logger.debug(f"soundfile could not read {file_path} ({e}), using librosa.load")
+            return librosa.load(file_path, sr=sr, mono=True, offset=offset, duration=duration,
+                                res_type='soxr_lq')
+        
+        y = data.mean(axis=1)
+        if native_sr != sr:
+            y = librosa.resample(y, orig_sr=native_sr, target_sr=sr, res_type='soxr_lq')
+        return y, sr
+    
+    def get_file_metadata(self, file_path: Union[str, Path, FileType]) -> Dict:
+        """Get existing metadata from an audio file.
+        
+        Args:
+            file_path: Path to the audio file, or a file already opened with
+                load_audio_file
         
         Returns:
             Dictionary with existing metadata
         """
         try:
-            audiofile = MutagenFile(str(file_path))
+            if isinstance(file_path, FileType):
+                audiofile = file_path
+            else:
+                audiofile = MutagenFile(str(file_path))
             
             if audiofile is None:
                 return {}
@@ -4,65 +4,206 @@ import asyncio
 import logging
 from typing import Set, List, Dict, Optional
 from datetime import datetime, timedelta
-import json
+import os
+import struct
+import threading
 from pathlib import Path
 
-from services.spotify_service import SpotifyService
+import msgspec
+from aiolimiter import AsyncLimiter
+
+from services.spotify_service import SpotifyService, Track
 from services.download_service import DownloadService
 from services.database_service import DatabaseService
 from config import Config
 
 logger = logging.getLogger(__name__)
 
+# Processed track IDs are kept as a compacted snapshot plus an append-only
+# log of IDs added since, each a 4-byte big-endian length + msgpack string
+_STATE_FILE = Path('.processed_tracks.msgpack')
+_LOG_FILE = Path('.processed_tracks.mpk')
+# Older versions stored the same data as JSON; read once to migrate
+_LEGACY_STATE_FILE = Path('.processed_tracks.json')
+# Sync stats are kept apart so updating them never rewrites the ID list
+_STATS_FILE = Path('.stats.json')
+
+# Fold the log back into the snapshot once it holds this many IDs
+_COMPACT_AFTER = 1000
+
+_FRAME_HEADER = struct.Struct('>I')
+
+class ProcessedState(msgspec.Struct):
+    """On-disk snapshot of the processed track IDs."""
+    processed_tracks: List[str]
+    last_updated: str
+
 class PlaylistSyncService:
     """Manages automated playlist synchronization."""
     
-    def __init__(self):
-        """Initialize playlist sync service."""
+    def __init__(self, db: DatabaseService):
+        """Initialize playlist sync service.
+        
+        Args:
+            db: Shared database service (the same instance the web app uses)
+        """
         self.spotify_service = SpotifyService()
         self.download_service = DownloadService()
-        self.database_service = DatabaseService()
+        self.database_service = db
         self.running = False
         self.last_check = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._last_snapshot: Optional[str] = None
+        self._download_slots = asyncio.Semaphore(Config.DOWNLOAD_CONCURRENCY)
+        # Token bucket that spreads bursts of new tracks over time
+        self._download_limiter = AsyncLimiter(Config.DOWNLOADS_PER_MINUTE, time_period=60)
+        self._pending_removals: List[Dict] = []
+        self._in_flight: Set[str] = set()
+        self._pending_ids: List[str] = []
+        self._dirty_count = 0
+        # State is written from worker threads (_save_state) and from the
+        # loop (stop_monitoring), which may overlap at shutdown; reentrant
+        # because _flush_pending compacts while holding it
+        self._state_lock = threading.RLock()
         self.processed_tracks = self._load_processed_tracks()
         self.stats = {
             'total_downloads': 0,
             'successful_downloads': 0,
             'failed_downloads': 0,
             'tracks_removed': 0,
+            'skipped_downloads': 0,
             'last_sync': None
         }
         
     def _load_processed_tracks(self) -> Set[str]:
-        """Load previously processed track IDs from cache file.
+        """Load previously processed track IDs from the snapshot and log.
         
         Returns:
             Set of processed track IDs
         """
-        cache_file = Path('.processed_tracks.json')
+        processed = set()
         try:
-            if cache_file.exists():
-                with open(cache_file, 'r') as f:
-                    data = json.load(f)
-                    return set(data.get('processed_tracks', []))
+            migrated = False
+            if _STATE_FILE.exists():
+                state = msgspec.msgpack.decode(_STATE_FILE.read_bytes(), type=ProcessedState)
+                processed.update(state.processed_tracks)
+            elif _LEGACY_STATE_FILE.exists():
+                data = msgspec.json.decode(_LEGACY_STATE_FILE.read_bytes())
+                logger.info(f"Migrating processed tracks cache from {_LEGACY_STATE_FILE}")
+                processed.update(data.get('processed_tracks', []))
+                migrated = True
+            
+            if _LOG_FILE.exists():
+                logged = self._read_log()
+                processed.update(logged)
+                self._dirty_count = len(logged)
+            
+            if migrated:
+                # Write the snapshot right away so later starts load it
+                # instead of migrating the JSON file again
+                self.processed_tracks = processed
+                self._compact()
         except Exception as e:
             logger.warning(f"Could not load processed tracks cache: {e}")
         
-        return set()
+        return processed
+    
+    def _read_log(self) -> List[str]:
+        """Read every complete frame from the append-only log.
+        
+        Returns:
+            Track IDs in the order they were logged
+        """
+        data = memoryview(_LOG_FILE.read_bytes())
+        decoder = msgspec.msgpack.Decoder(str)
+        header_size = _FRAME_HEADER.size
+        track_ids = []
+        
+        pos = 0
+        while pos + header_size <= len(data):
+            (size,) = _FRAME_HEADER.unpack_from(data, pos)
+            if pos + header_size + size > len(data):
+                break
+            pos += header_size
+            track_ids.append(decoder.decode(data[pos:pos + size]))
+            pos += size
+        
+        if pos < len(data):
+            # Torn final write; drop it so later appends start on a frame boundary
+            logger.warning("Dropping truncated entry at the end of the processed tracks log")
+            os.truncate(_LOG_FILE, pos)
+        
+        return track_ids
+    
+    def _mark_processed(self, track_id: str):
+        """Record a track as processed and queue it for the log.
+        
+        Args:
+            track_id: Spotify track ID
+        """
+        if track_id not in self.processed_tracks:
+            self.processed_tracks.add(track_id)
+            self._pending_ids.append(track_id)
+    
+    def _flush_pending(self):
+        """Append newly processed track IDs to the log, compacting when it grows large."""
+        with self._state_lock:
+            if not self._pending_ids:
+                return
+            
+            try:
+                encode = msgspec.msgpack.encode
+                frames = []
+                for track_id in self._pending_ids:
+                    encoded = encode(track_id)
+                    frames.append(_FRAME_HEADER.pack(len(encoded)))
+                    frames.append(encoded)
+                
+                with open(_LOG_FILE, 'ab') as f:
+                    f.write(b''.join(frames))
+                
+                self._dirty_count += len(self._pending_ids)
+                self._pending_ids.clear()
+            except Exception as e:
+                logger.error(f"Could not save processed tracks cache: {e}")
+                return
+            
+            if self._dirty_count > _COMPACT_AFTER:
+                self._compact()
+    
+    def _compact(self):
+        """Rewrite the snapshot with every processed ID and start a fresh log."""
+        with self._state_lock:
+            try:
+                state = ProcessedState(
+                    processed_tracks=list(self.processed_tracks),
+                    last_updated=datetime.now().isoformat()
+                )
+                # Write to a temporary file and rename so a crash never leaves a
+                # half-written snapshot behind
+                tmp_file = _STATE_FILE.with_name(_STATE_FILE.name + '.tmp')
+                tmp_file.write_bytes(msgspec.msgpack.encode(state))
+                os.replace(tmp_file, _STATE_FILE)
+                
+                _LOG_FILE.unlink(missing_ok=True)
+                self._pending_ids.clear()
+                self._dirty_count = 0
+                logger.debug(f"Compacted processed tracks cache ({len(self.processed_tracks)} tracks)")
+            except Exception as e:
+                logger.error(f"Could not compact processed tracks cache: {e}")
     
-    def _save_processed_tracks(self):
-        """Save processed track IDs to cache file."""
-        cache_file = Path('.processed_tracks.json')
+    def _save_state(self):
+        """Append pending track IDs to the log and write the sync stats."""
+        self._flush_pending()
+        self._save_stats()
+    
+    def _save_stats(self):
+        """Write the sync stats to their own file."""
         try:
-            data = {
-                'processed_tracks': list(self.processed_tracks),
-                'last_updated': datetime.now().isoformat(),
-                'stats': self.stats
-            }
-            with open(cache_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Still indented so the file stays readable by hand
+            _STATS_FILE.write_bytes(msgspec.json.format(msgspec.json.encode(self.stats), indent=2))
         except Exception as e:
-            logger.error(f"Could not save processed tracks cache: {e}")
+            logger.error(f"Could not save sync stats: {e}")
     
     async def start_monitoring(self):
         """Start monitoring the playlist for new tracks with smart polling."""
@@ -71,6 +212,7 @@ class PlaylistSyncService:
             return
         
         self.running = True
+        self._stop_event = asyncio.Event()
         logger.info(f"Starting smart playlist monitoring (checking every {Config.POLL_INTERVAL_SECONDS} seconds)...")
         
         # Initial check
@@ -83,19 +225,14 @@ class PlaylistSyncService:
         
         while self.running:
             try:
-                await asyncio.sleep(current_interval)
-                if not self.running:  # Check if still running after sleep
+                if await self._wait_for_stop(current_interval):
                     break
                 
-                # Store previous track count for change detection
-                previous_processed_count = len(self.processed_tracks)
-                
                 # Check for changes
-                await self._check_playlist()
+                new_count = await self._check_playlist()
                 
                 # Adjust polling interval based on activity
-                current_processed_count = len(self.processed_tracks)
-                if current_processed_count > previous_processed_count:
+                if new_count > 0:
                     # New tracks were processed, reset to fast polling
                     current_interval = Config.POLL_INTERVAL_SECONDS
                     no_change_count = 0
@@ -114,7 +251,23 @@ class PlaylistSyncService:
                 logger.error(f"Error in monitoring loop: {e}")
                 # Reset to default interval on error
                 current_interval = Config.POLL_INTERVAL_SECONDS
-                await asyncio.sleep(30)
+                if await self._wait_for_stop(30):
+                    break
+    
+    async def _wait_for_stop(self, timeout: float) -> bool:
+        """Sleep until the timeout expires or monitoring is stopped.
+        
+        Args:
+            timeout: Maximum time to wait, in seconds
+        
+        Returns:
+            True if monitoring was stopped during the wait
+        """
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
     
     def stop_monitoring(self):
         """Stop monitoring the playlist."""
@@ -122,129 +275,262 @@ class PlaylistSyncService:
             return
         
         self.running = False
+        if self._stop_event:
+            # Wake the monitor loop so it exits now rather than after its sleep
+            self._stop_event.set()
         logger.info("Stopping playlist monitoring...")
-        self._save_processed_tracks()
+        self._flush_pending()
     
-    async def _check_playlist(self):
-        """Check playlist for new tracks and process them."""
+    async def _check_playlist(self) -> int:
+        """Check playlist for new tracks and process them.
+        
+        Returns:
+            Number of new tracks found
+        """
         try:
             logger.info("Checking playlist for new tracks...")
             self.last_check = datetime.now()
             
+            # The snapshot ID changes whenever the playlist is edited, so an
+            # unchanged one means there is nothing new to fetch
+            snapshot_id = self.spotify_service.get_playlist_snapshot(Config.SPOTIFY_PLAYLIST_ID)
+            if snapshot_id and snapshot_id == self._last_snapshot:
+                logger.info("Playlist unchanged since last check")
+                return 0
+            # Only recorded once the check has fully succeeded, so a failed
+            # one is retried on the next poll
+            self._last_snapshot = None
+            
             # Get playlist info
             playlist_info = self.spotify_service.get_playlist_info(Config.SPOTIFY_PLAYLIST_ID)
             if not playlist_info:
                 logger.error("Could not get playlist information")
-                return
+                return 0
             
             logger.info(f"Monitoring playlist: {playlist_info['name']} "
                        f"(Total tracks: {playlist_info['total_tracks']})")
             
             # Get current tracks
-            tracks = self.spotify_service.get_playlist_tracks(Config.SPOTIFY_PLAYLIST_ID)
+            tracks = self.spotify_service.get_playlist_tracks(Config.SPOTIFY_PLAYLIST_ID, snapshot_id)
             if not tracks:
                 logger.info("No tracks found in playlist")
-                return
+                return 0
             
-            # Find new tracks (not previously processed)
-            new_tracks = [track for track in tracks if track['id'] not in self.processed_tracks]
+            # Find new tracks (not previously processed); bind the sets locally
+            # so the loop doesn't look them up on self per track. Tracks are
+            # claimed in the in-flight set, so one listed twice or already being
+            # downloaded by an overlapping check is never fetched twice.
+            processed = self.processed_tracks
+            in_flight = self._in_flight
+            new_tracks = []
+            # Every position of each track, so duplicates are removed too
+            occurrences: Dict[str, List[int]] = {}
+            for track in tracks:
+                occurrences.setdefault(track.uri, []).append(track.playlist_position)
+                if track.id not in processed and track.id not in in_flight:
+                    in_flight.add(track.id)
+                    new_tracks.append(track)
             
             if not new_tracks:
                 logger.info("No new tracks found")
-                return
+                self._last_snapshot = snapshot_id
+                return 0
             
             logger.info(f"Found {len(new_tracks)} new tracks to download")
             
-            # Process new tracks
-            for track in new_tracks:
-                if not self.running:  # Check if we should stop
-                    break
-                    
-                await self._process_track(track)
-                # Small delay between downloads to be respectful
-                await asyncio.sleep(2)
+            # Download records whose track got as far as _process_track, and
+            # those it finished (which always finalizes the record)
+            db_ids: List[int] = []
+            started: Set[int] = set()
+            settled: Set[int] = set()
+            try:
+                # Record all new tracks in one transaction
+                db_ids = await self.database_service.add_downloads_bulk([
+                    {
+                        'filename': track.clean_filename,
+                        'original_url': None,  # No direct URL for Spotify tracks
+                        'source_type': 'playlist',
+                        'artist': track.artist_string,
+                        'track_name': track.name,
+                        'search_query': track.search_query,
+                        'spotify_track_id': track.id
+                    }
+                    for track in new_tracks
+                ])
+                
+                # Process new tracks concurrently, at most DOWNLOAD_CONCURRENCY at a time
+                results = await asyncio.gather(
+                    *(self._process_track_bounded(track, db_id, started, settled)
+                      for track, db_id in zip(new_tracks, db_ids)),
+                    return_exceptions=True
+                )
+                for track, result in zip(new_tracks, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Unexpected error processing track {track.id}: {result}")
+                
+            finally:
+                in_flight.difference_update(track.id for track in new_tracks)
+                await self._discard_unfinished(db_ids, started, settled)
+            
+            self._flush_removals(snapshot_id, occurrences)
+            
+            # Tracks that were not processed (e.g. skipped at shutdown or hit
+            # by an unexpected error) are picked up again on the next poll
+            if all(track.id in processed for track in new_tracks):
+                self._last_snapshot = snapshot_id
             
             self.stats['last_sync'] = datetime.now().isoformat()
-            self._save_processed_tracks()
+            # Every track of this check has finished, so nothing touches the
+            # pending IDs or stats while a worker thread writes them out
+            await asyncio.to_thread(self._save_state)
+            return len(new_tracks)
             
         except Exception as e:
             logger.error(f"Error checking playlist: {e}")
+            # Check the whole playlist again next time
+            self._last_snapshot = None
+            return 0
+    
+    def _flush_removals(self, snapshot_id: Optional[str], occurrences: Dict[str, List[int]]):
+        """Remove every successfully downloaded track from the playlist.
+        
+        Args:
+            snapshot_id: Snapshot the track positions were read from
+            occurrences: Track URI -> every position it holds in that snapshot
+        """
+        if not self._pending_removals:
+            return
+        
+        items, self._pending_removals = self._pending_removals, []
+        for item in items:
+            item['positions'] = occurrences.get(item['uri'], item['positions'])
+        removed = self.spotify_service.remove_tracks_batch(
+            Config.SPOTIFY_PLAYLIST_ID, items, snapshot_id=snapshot_id
+        )
+        self.stats['tracks_removed'] += removed
+        
+        if removed == len(items):
+            logger.info(f"Removed {removed} tracks from playlist")
+        else:
+            logger.warning(f"Could not remove {len(items) - removed} of {len(items)} tracks from playlist")
+    
+    async def _discard_unfinished(self, db_ids: List[int], started: Set[int], settled: Set[int]):
+        """Finalize the download records of tracks that did not finish.
+        
+        Records of tracks that never started are deleted, so they don't show
+        up in history and are inserted afresh when the track is retried.
+        Records of tracks interrupted mid-download are marked failed.
+        
+        Args:
+            db_ids: Database IDs of every record created for the check
+            started: IDs of records whose track reached _process_track
+            settled: IDs of records _process_track finalized
+        """
+        unstarted = [db_id for db_id in db_ids if db_id not in started]
+        if unstarted:
+            await self.database_service.delete_downloads(unstarted)
+        
+        for db_id in started - settled:
+            await self.database_service.update_download_failed(
+                download_id=db_id,
+                error_message='Interrupted before the download finished'
+            )
+    
+    def _stop_requested(self) -> bool:
+        """Return True once stop_monitoring has been called.
+        
+        Unlike checking self.running, this lets manual_sync (which runs while
+        monitoring is off) process tracks.
+        """
+        return self._stop_event is not None and self._stop_event.is_set()
     
-    async def _process_track(self, track: Dict):
+    async def _process_track_bounded(self, track: Track, db_id: int,
+                                     started: Set[int], settled: Set[int]):
+        """Process a track once a download slot and a rate-limit token are free.
+        
+        Args:
+            track: Track to process
+            db_id: Database ID of the track's download record
+            started: Receives db_id once the track starts processing
+            settled: Receives db_id once its record has been finalized
+        """
+        # Check for a stop before each wait, so tracks queued at shutdown
+        # neither hold a slot nor use up a rate-limit token
+        if self._skip_if_stopping(track):
+            return
+        async with self._download_slots:
+            if self._skip_if_stopping(track):
+                return
+            async with self._download_limiter:
+                if self._skip_if_stopping(track):
+                    return
+                started.add(db_id)
+                await self._process_track(track, db_id)
+                settled.add(db_id)
+    
+    def _skip_if_stopping(self, track: Track) -> bool:
+        """Log and report whether a queued track is skipped because of a stop.
+        
+        Args:
+            track: Track about to be processed
+        
+        Returns:
+            True if the track should not be processed
+        """
+        if not self._stop_requested():
+            return False
+        self.stats['skipped_downloads'] += 1
+        logger.info(f"Skipping {track.artist_string} - {track.name}: sync is stopping")
+        return True
+    
+    async def _process_track(self, track: Track, db_id: int):
         """Process a single track: download and optionally remove from playlist.
         
         Args:
-            track: Track information dictionary
+            track: Track to process
+            db_id: Database ID of the track's download record
         """
-        track_id = track['id']
-        track_name = f"{track['artist_string']} - {track['name']}"
+        track_id = track.id
+        track_name = f"{track.artist_string} - {track.name}"
         
         try:
             logger.info(f"Processing track: {track_name}")
             self.stats['total_downloads'] += 1
             
-            # Add download record to database
-            db_id = await self.database_service.add_download(
-                filename=track['clean_filename'],
-                original_url=None,  # No direct URL for Spotify tracks
-                source_type='playlist',
-                artist=track['artist_string'],
-                track_name=track['name'],
-                search_query=track['search_query'],
-                spotify_track_id=track['id']
-            )
-            
-            # Download the track
+            # Download the track; it is tagged with the Spotify info (if enabled)
+            # in the same pass, so the file's tags are only parsed and saved once
             download_result = await self.download_service.search_and_download(
-                search_query=track['search_query'],
-                custom_filename=track['clean_filename']
+                search_query=track.search_query,
+                custom_filename=track.clean_filename,
+                metadata={
+                    'artist': track.artist_string,
+                    'title': track.name,
+                    'album': track.album,
+                    'genre': Config.DEFAULT_GENRE,
+                }
             )
             
-            # If download was successful, set metadata with Spotify info (if enabled)
-            if (download_result['status'] == 'completed' and 
-                download_result.get('filepath') and 
-                Config.ENABLE_METADATA_TAGGING):
-                try:
-                    await self.download_service.set_file_metadata(
-                        file_path=download_result['filepath'],
-                        artist=track['artist_string'],
-                        title=track['name'],
-                        album=track['album'],
-                        genre=Config.DEFAULT_GENRE
-                    )
-                except Exception as e:
-                    logger.warning(f"Failed to set Spotify metadata: {e}")
-            
             if download_result['status'] == 'completed':
                 logger.info(f"Successfully downloaded: {track_name}")
                 self.stats['successful_downloads'] += 1
                 
                 # Update database with success
                 if download_result.get('filepath'):
-                    file_path = Path(download_result['filepath'])
-                    file_size = file_path.stat().st_size if file_path.exists() else 0
-                    
                     await self.database_service.update_download_success(
                         download_id=db_id,
-                        file_path=str(file_path),
-                        file_size=file_size
+                        file_path=download_result['filepath'],
+                        file_size=download_result.get('file_size', 0)
                     )
                 
                 # Mark as processed
-                self.processed_tracks.add(track_id)
+                self._mark_processed(track_id)
                 
-                # Remove from playlist after successful download
-                removed = self.spotify_service.remove_track_from_playlist(
-                    playlist_id=Config.SPOTIFY_PLAYLIST_ID,
-                    track_uri=track['uri'],
-                    position=track.get('playlist_position')
-                )
-                
-                if removed:
-                    logger.info(f"Removed track from playlist: {track_name}")
-                    self.stats['tracks_removed'] += 1
-                else:
-                    logger.warning(f"Could not remove track from playlist: {track_name}")
+                # Queue removal from the playlist; removals are sent in
+                # batches once the whole check has finished
+                self._pending_removals.append({
+                    'uri': track.uri,
+                    'positions': [track.playlist_position]
+                })
                 
             else:
                 logger.error(f"Download failed for {track_name}: {download_result.get('error', 'Unknown error')}")
@@ -258,24 +544,23 @@ class PlaylistSyncService:
                 
                 # Still mark as processed to avoid retrying failed downloads
                 # You can modify this behavior if you want to retry failed downloads
-                self.processed_tracks.add(track_id)
+                self._mark_processed(track_id)
                 
         except Exception as e:
             logger.error(f"Error processing track {track_name}: {e}")
             self.stats['failed_downloads'] += 1
             
-            # Update database with failure if db_id exists
-            if 'db_id' in locals():
-                try:
-                    await self.database_service.update_download_failed(
-                        download_id=db_id,
-                        error_message=str(e)
-                    )
-                except Exception as db_error:
-                    logger.error(f"Failed to update database for error case: {db_error}")
+            # Update database with failure
+            try:
+                await self.database_service.update_download_failed(
+                    download_id=db_id,
+                    error_message=str(e)
+                )
+            except Exception as db_error:
+                logger.error(f"Failed to update database for error case: {db_error}")
                     
             # Mark as processed to avoid infinite retries
-            self.processed_tracks.add(track_id)
+            self._mark_processed(track_id)
     
     def get_status(self) -> Dict:
         """Get current status of the playlist sync service.
@@ -307,6 +592,9 @@ class PlaylistSyncService:
         
         try:
             logger.info("Starting manual playlist sync...")
+            # A fresh event, so a stop from an earlier monitoring run
+            # doesn't make this sync skip every track
+            self._stop_event = asyncio.Event()
             await self._check_playlist()
             
             return {
@@ -325,7 +613,8 @@ class PlaylistSyncService:
     def reset_processed_tracks(self):
         """Reset the processed tracks cache (will reprocess all tracks in playlist)."""
         self.processed_tracks.clear()
-        self._save_processed_tracks()
+        self._last_snapshot = None
+        self._compact()
         logger.info("Reset processed tracks cache")
     
     def get_playlist_preview(self) -> Optional[Dict]:
@@ -340,15 +629,16 @@ class PlaylistSyncService:
                 return None
             
             tracks = self.spotify_service.get_playlist_tracks(Config.SPOTIFY_PLAYLIST_ID)
+            processed = self.processed_tracks
             
             new_tracks = [
                 {
-                    'id': track['id'],
-                    'name': track['name'],
-                    'artist': track['artist_string'],
-                    'search_query': track['search_query'],
-                    'clean_filename': track['clean_filename'],
-                    'processed': track['id'] in self.processed_tracks
+                    'id': track.id,
+                    'name': track.name,
+                    'artist': track.artist_string,
+                    'search_query': track.search_query,
+                    'clean_filename': track.clean_filename,
+                    'processed': track.id in processed
                 }
                 for track in tracks
             ]
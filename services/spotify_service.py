@@ -2,65 +2,189 @@
 
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
+import functools
 import logging
-from typing import List, Dict, Optional
+import re
+import time
+from typing import List, Dict, Optional, Tuple
+
+import msgspec
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
 from config import Config
+from .constants import INVALID_FILENAME_CHARS
 
 logger = logging.getLogger(__name__)
 
+# Playlist ID from a bare ID, a spotify:playlist: URI or an open.spotify.com URL
+_PLAYLIST_ID_RE = re.compile(r'(?:spotify:playlist:|/playlist/)?([A-Za-z0-9]{22})')
+
+# Only the fields _extract_track_info and get_playlist_info read, so
+# Spotify leaves out markets, images and the like from its responses
+_TRACK_FIELDS = (
+    'items(track(type,id,name,artists(name),album(name),duration_ms,explicit,uri)),next,total'
+)
+_INFO_FIELDS = 'id,name,description,public,collaborative,owner(display_name),external_urls,tracks(total)'
+
+# How long get_playlist_info reuses a fetched result, in seconds
+_INFO_TTL_SECONDS = 10
+
+# Default for get_playlist_tracks' snapshot_id: look it up. A caller that
+# already tried passes its result instead, even when that is None.
+_LOOKUP_SNAPSHOT = object()
+
+
+class Track(msgspec.Struct, frozen=True):
+    """A playlist track, reduced to the fields the sync service uses."""
+    
+    id: str
+    name: str
+    artists: Tuple[str, ...]
+    artist_string: str
+    album: str
+    duration_ms: int
+    explicit: bool
+    uri: str
+    search_query: str
+    clean_filename: str
+    playlist_position: int
+
+
 class SpotifyService:
     """Manages Spotify API interactions for playlist monitoring."""
     
     def __init__(self):
-        """Initialize Spotify service with OAuth."""
-        self.sp = None
-        self._setup_spotify_client()
+        """Initialize Spotify service; the API client is created on first use."""
+        self._sp = None
+        # playlist_id -> (fetch time, info) and playlist_id -> (snapshot_id, tracks)
+        self._info_cache: Dict[str, Tuple[float, Dict]] = {}
+        self._tracks_cache: Dict[str, Tuple[str, List[Track]]] = {}
+    
+    @property
+    def sp(self) -> spotipy.Spotify:
+        """Spotify API client, set up on first access."""
+        if self._sp is None:
+            self._setup_spotify_client()
+        return self._sp
+    
+    @staticmethod
+    def _build_session() -> requests.Session:
+        """Create the HTTP session shared by the API client and OAuth refreshes.
+        
+        Returns:
+            Session that keeps connections alive between polls and retries
+            rate-limited and transient server errors
+        """
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE'])
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        
+        session = requests.Session()
+        session.mount('https://', adapter)
+        return session
     
     def _setup_spotify_client(self):
         """Set up Spotify client with proper authentication."""
         try:
             scope = "playlist-read-private playlist-modify-private playlist-modify-public"
+            session = self._build_session()
             
             auth_manager = SpotifyOAuth(
                 client_id=Config.SPOTIPY_CLIENT_ID,
                 client_secret=Config.SPOTIPY_CLIENT_SECRET,
                 redirect_uri=Config.SPOTIPY_REDIRECT_URI,
                 scope=scope,
-                cache_path=".spotify_cache"
+                cache_path=".spotify_cache",
+                requests_session=session
             )
             
-            self.sp = spotipy.Spotify(auth_manager=auth_manager)
+            self._sp = spotipy.Spotify(auth_manager=auth_manager, requests_session=session)
             logger.info("Spotify client initialized successfully")
             
         except Exception as e:
             logger.error(f"Failed to initialize Spotify client: {e}")
             raise
     
-    def get_playlist_tracks(self, playlist_id: str) -> List[Dict]:
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _normalize_playlist_id(playlist_id: str) -> str:
+        """Extract the bare playlist ID from an ID, URI or URL.
+        
+        Args:
+            playlist_id: Spotify playlist ID, URI or URL
+        
+        Returns:
+            Bare playlist ID, or the input unchanged if none is found
+        """
+        match = _PLAYLIST_ID_RE.search(playlist_id)
+        return match.group(1) if match else playlist_id
+    
+    def get_playlist_snapshot(self, playlist_id: str) -> Optional[str]:
+        """Get the playlist's current snapshot ID, which changes on every edit.
+        
+        Args:
+            playlist_id: Spotify playlist ID (can be full URI or just ID)
+        
+        Returns:
+            Snapshot ID or None if error
+        """
+        try:
+            playlist_id = self._normalize_playlist_id(playlist_id)
+            return self.sp.playlist(playlist_id, fields='snapshot_id')['snapshot_id']
+            
+        except Exception as e:
+            logger.error(f"Error getting playlist snapshot: {e}")
+            return None
+    
+    def get_playlist_tracks(self, playlist_id: str, snapshot_id: Optional[str] = _LOOKUP_SNAPSHOT) -> List[Track]:
         """Get all tracks from a playlist.
         
+        The track list is cached against the playlist's snapshot ID, so it is
+        only downloaded again after the playlist has changed.
+        
         Args:
             playlist_id: Spotify playlist ID (can be full URI or just ID)
+            snapshot_id: Current snapshot ID, if the caller already fetched it;
+                None (a failed lookup) skips the cache without fetching it again
         
         Returns:
-            List of track dictionaries with simplified information
+            List of tracks with simplified information
         """
         try:
-            # Extract playlist ID from URI if needed
-            if playlist_id.startswith('spotify:playlist:'):
-                playlist_id = playlist_id.split(':')[-1]
-            elif playlist_id.startswith('https://open.spotify.com/playlist/'):
-                playlist_id = playlist_id.split('/')[-1].split('?')[0]
+            playlist_id = self._normalize_playlist_id(playlist_id)
+            
+            if snapshot_id is _LOOKUP_SNAPSHOT:
+                snapshot_id = self.get_playlist_snapshot(playlist_id)
+            cached = self._tracks_cache.get(playlist_id)
+            if snapshot_id and cached and cached[0] == snapshot_id:
+                logger.debug(f"Playlist {playlist_id} unchanged, using cached tracks")
+                return list(cached[1])
             
-            tracks = []
-            results = self.sp.playlist_tracks(playlist_id)
+            results = self.sp.playlist_tracks(playlist_id, fields=_TRACK_FIELDS, limit=100)
+            # The first page reports the playlist size, so allocate the list once
+            tracks = [None] * results['total']
+            count = 0
+            # Position in the playlist itself, counting skipped items (episodes,
+            # unavailable tracks) so removals by position hit the right entry
+            offset = 0
             
             while results:
                 for item in results['items']:
                     if item['track'] and item['track']['type'] == 'track':
-                        track_info = self._extract_track_info(item['track'])
-                        track_info['playlist_position'] = len(tracks)
-                        tracks.append(track_info)
+                        track_info = self._extract_track_info(item['track'], offset)
+                        if count < len(tracks):
+                            tracks[count] = track_info
+                        else:
+                            # Playlist grew while paging
+                            tracks.append(track_info)
+                        count += 1
+                    offset += 1
                 
                 # Get next batch if available
                 if results['next']:
@@ -68,38 +192,44 @@ class SpotifyService:
                 else:
                     break
             
+            # Drop the slots left for skipped items
+            del tracks[count:]
+            
+            if snapshot_id:
+                self._tracks_cache[playlist_id] = (snapshot_id, tracks)
+            
             logger.info(f"Retrieved {len(tracks)} tracks from playlist {playlist_id}")
-            return tracks
+            return list(tracks)
             
         except Exception as e:
             logger.error(f"Error getting playlist tracks: {e}")
             return []
     
-    def _extract_track_info(self, track: Dict) -> Dict:
+    def _extract_track_info(self, track: Dict, position: int) -> Track:
         """Extract relevant information from a Spotify track object.
         
         Args:
             track: Spotify track object
+            position: Position of the track in the playlist
         
         Returns:
-            Simplified track information dictionary
+            Simplified track information
         """
-        artists = [artist['name'] for artist in track['artists']]
-        
-        return {
-            'id': track['id'],
-            'name': track['name'],
-            'artists': artists,
-            'artist_string': ', '.join(artists),
-            'album': track['album']['name'],
-            'duration_ms': track['duration_ms'],
-            'explicit': track['explicit'],
-            'external_urls': track['external_urls'],
-            'preview_url': track['preview_url'],
-            'uri': track['uri'],
-            'search_query': f"{artists[0]} - {track['name']}" if artists else track['name'],
-            'clean_filename': self._create_clean_filename(artists[0] if artists else '', track['name'])
-        }
+        artists = tuple(artist['name'] for artist in track['artists'])
+        
+        return Track(
+            id=track['id'],
+            name=track['name'],
+            artists=artists,
+            artist_string=', '.join(artists),
+            album=track['album']['name'],
+            duration_ms=track['duration_ms'],
+            explicit=track['explicit'],
+            uri=track['uri'],
+            search_query=f"{artists[0]} - {track['name']}" if artists else track['name'],
+            clean_filename=self._create_clean_filename(artists[0] if artists else '', track['name']),
+            playlist_position=position
+        )
     
     def _create_clean_filename(self, artist: str, track_name: str) -> str:
         """Create a clean filename from artist and track name.
@@ -114,13 +244,8 @@ class SpotifyService:
         # Combine artist and track name
         filename = f"{artist} - {track_name}" if artist else track_name
         
-        # Remove or replace problematic characters
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            filename = filename.replace(char, '')
-        
-        # Replace multiple spaces with single space
-        filename = ' '.join(filename.split())
+        # Remove problematic characters in one pass, then collapse whitespace
+        filename = ' '.join(filename.translate(INVALID_FILENAME_CHARS).split())
         
         # Trim length if needed (filesystem limits)
         if len(filename) > 200:
@@ -140,9 +265,7 @@ class SpotifyService:
             True if successful, False otherwise
         """
         try:
-            # Extract playlist ID from URI if needed
-            if playlist_id.startswith('spotify:playlist:'):
-                playlist_id = playlist_id.split(':')[-1]
+            playlist_id = self._normalize_playlist_id(playlist_id)
             
             # Prepare track removal data
             tracks_to_remove = [{"uri": track_uri}]
@@ -157,6 +280,49 @@ class SpotifyService:
             logger.error(f"Error removing track from playlist: {e}")
             return False
     
+    def remove_tracks_batch(self, playlist_id: str, items: List[Dict],
+                            snapshot_id: Optional[str] = None) -> int:
+        """Remove several tracks from the playlist, up to 100 per request.
+        
+        Args:
+            playlist_id: Spotify playlist ID
+            items: Dictionaries with the track 'uri' and its 'positions'
+            snapshot_id: Snapshot the positions were read from, so Spotify
+                applies them to that version even if the playlist changed since
+        
+        Returns:
+            Number of tracks removed
+        """
+        playlist_id = self._normalize_playlist_id(playlist_id)
+        
+        # Remove from the end of the playlist first, so removing one chunk
+        # doesn't shift the positions of the tracks in the next
+        items = sorted(items, key=lambda item: max(item['positions']), reverse=True)
+        
+        removed = 0
+        for start in range(0, len(items), 100):
+            chunk = items[start:start + 100]
+            try:
+                self.sp.playlist_remove_specific_occurrences_of_items(
+                    playlist_id, chunk, snapshot_id=snapshot_id
+                )
+                removed += len(chunk)
+                logger.info(f"Removed {len(chunk)} tracks from playlist {playlist_id}")
+            except Exception as e:
+                logger.warning(f"Could not remove tracks by position ({e}), removing them by URI")
+                # The tracks are already marked processed and won't be
+                # retried, so fall back to removing every occurrence
+                try:
+                    self.sp.playlist_remove_all_occurrences_of_items(
+                        playlist_id, [item['uri'] for item in chunk]
+                    )
+                    removed += len(chunk)
+                    logger.info(f"Removed {len(chunk)} tracks from playlist {playlist_id}")
+                except Exception as e:
+                    logger.error(f"Error removing tracks from playlist: {e}")
+        
+        return removed
+    
     def get_playlist_info(self, playlist_id: str) -> Optional[Dict]:
         """Get basic playlist information.
         
@@ -167,12 +333,15 @@ class SpotifyService:
             Playlist information or None if error
         """
         try:
-            # Extract playlist ID from URI if needed
-            if playlist_id.startswith('spotify:playlist:'):
-                playlist_id = playlist_id.split(':')[-1]
+            playlist_id = self._normalize_playlist_id(playlist_id)
+            
+            # Reuse a recent result, e.g. when a preview follows a sync
+            cached = self._info_cache.get(playlist_id)
+            if cached and time.monotonic() - cached[0] < _INFO_TTL_SECONDS:
+                return cached[1]
             
-            playlist = self.sp.playlist(playlist_id)
-            return {
+            playlist = self.sp.playlist(playlist_id, fields=_INFO_FIELDS)
+            info = {
                 'id': playlist['id'],
                 'name': playlist['name'],
                 'description': playlist['description'],
@@ -182,6 +351,8 @@ class SpotifyService:
                 'owner': playlist['owner']['display_name'],
                 'external_urls': playlist['external_urls']
             }
+            self._info_cache[playlist_id] = (time.monotonic(), info)
+            return info
             
         except Exception as e:
             logger.error(f"Error getting playlist info: {e}")
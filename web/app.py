@@ -1,15 +1,24 @@
 """FastAPI web application for manual audio downloads."""
 
 import asyncio
-import json
+import functools
+import heapq
 import logging
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+import os
+import sys
+from fastapi import FastAPI, WebSocket, Request, Form
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
 import uvicorn
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+from contextlib import asynccontextmanager
+
+import anyio
+import jinja2
+import msgspec
 
 from services.download_service import DownloadService
 from services.database_service import DatabaseService
@@ -17,60 +26,174 @@ from config import Config
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="MixSync", description="Audio Download Service")
+# WebSocket messages are encoded straight to UTF-8 bytes and sent as binary frames
+_dumps = msgspec.json.encode
+
+
+class MsgspecJSONResponse(JSONResponse):
+    """JSONResponse that encodes its content with msgspec instead of json.dumps.
+    
+    Handlers return it directly, which also skips FastAPI's jsonable_encoder
+    pass over plain dict return values.
+    """
+    
+    def render(self, content) -> bytes:
+        return _dumps(content)
+
+
+# Latest unsent progress update per download ID. yt-dlp reports progress from
+# a worker thread many times a second; only the newest update matters, so the
+# callback just overwrites its entry and _flush_progress broadcasts them
+_latest_progress: Dict[str, Dict] = {}
+_PROGRESS_INTERVAL = 0.2
+
+async def _flush_progress():
+    """Broadcast the latest progress of each active download, five times a second."""
+    while True:
+        await asyncio.sleep(_PROGRESS_INTERVAL)
+        if not manager.active_connections:
+            # Don't encode updates no one will receive
+            _latest_progress.clear()
+            continue
+        
+        # popitem is atomic, so updates written meanwhile by download threads
+        # are either sent now or kept for the next round
+        while _latest_progress:
+            download_id, progress_info = _latest_progress.popitem()
+            try:
+                await manager.broadcast(_dumps({
+                    "type": "progress",
+                    "download_id": download_id,
+                    "data": progress_info
+                }))
+            except Exception as e:
+                logger.error(f"Error broadcasting progress for {download_id}: {e}")
+
+def _build_health_body(download_path_exists: bool) -> bytes:
+    """Build the encoded /health response body."""
+    return _dumps({
+        "status": "healthy",
+        "download_path": str(Config.DOWNLOAD_PATH),
+        "download_path_exists": download_path_exists
+    })
+
+# /health body; rebuilt once the download folder has been created at startup
+_health_body = _build_health_body(False)
+
+# Starlette runs static file reads and other blocking calls on AnyIO's thread
+# pool, which defaults to 40 threads
+_ANYIO_THREAD_LIMIT = 200
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Prepare the download folder and thread pool and run the progress broadcaster."""
+    global _health_body
+    Config.setup_directories()
+    _health_body = _build_health_body(True)
+    
+    anyio.to_thread.current_default_thread_limiter().total_tokens = _ANYIO_THREAD_LIMIT
+    progress_task = asyncio.create_task(_flush_progress())
+    try:
+        yield
+    finally:
+        progress_task.cancel()
+
+app = FastAPI(
+    title="MixSync",
+    description="Audio Download Service",
+    default_response_class=MsgspecJSONResponse,
+    lifespan=lifespan
+)
 
 # Setup templates and static files
 templates = Jinja2Templates(directory="web/templates")
+# Templates don't change while the server runs: skip the per-render mtime
+# check and keep compiled bytecode across restarts
+templates.env.auto_reload = False
+templates.env.bytecode_cache = jinja2.FileSystemBytecodeCache()
 app.mount("/static", StaticFiles(directory="web/static"), name="static")
 
 # Initialize services
 download_service = DownloadService()
 database_service = DatabaseService()
 
+# Longest a broadcast waits for one client to accept a message, in seconds
+_SEND_TIMEOUT = 2.0
+
 # WebSocket connection manager
 class ConnectionManager:
     """Manages WebSocket connections for real-time updates."""
     
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Set[WebSocket] = set()
+        # Strong references to pending close tasks; the loop only keeps weak ones
+        self._close_tasks: Set[asyncio.Task] = set()
     
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
     
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
     
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+    async def send_personal_message(self, payload: bytes, websocket: WebSocket):
         try:
-            await websocket.send_text(message)
+            await websocket.send_bytes(payload)
         except:
             self.disconnect(websocket)
     
-    async def broadcast(self, message: str):
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                disconnected.append(connection)
+    async def broadcast(self, payload: bytes):
+        if not self.active_connections:
+            return
+        
+        # Send to every client concurrently so one slow socket doesn't hold
+        # up the others; all of them share one prebuilt ASGI send message
+        frame = {"type": "websocket.send", "bytes": payload}
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(connection.send(frame), _SEND_TIMEOUT) for connection in connections),
+            return_exceptions=True
+        )
         
         # Remove disconnected connections
-        for conn in disconnected:
-            self.disconnect(conn)
+        for conn, result in zip(connections, results):
+            if isinstance(result, asyncio.TimeoutError):
+                # Client isn't reading fast enough; drop it rather than let
+                # it hold up every later broadcast. 1013 asks it to retry later.
+                logger.warning("Dropping slow WebSocket client")
+                self.disconnect(conn)
+                task = asyncio.create_task(self._close(conn, code=1013))
+                self._close_tasks.add(task)
+                task.add_done_callback(self._close_tasks.discard)
+            elif isinstance(result, Exception):
+                self.disconnect(conn)
+    
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
 
 manager = ConnectionManager()
 
+@functools.cache
+def _render_page(name: str) -> bytes:
+    """Render a page template once and keep the encoded HTML.
+    
+    The pages take no per-request values; everything dynamic is loaded by
+    the page's JavaScript, so one rendering serves every request.
+    """
+    return templates.get_template(name).render().encode()
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Serve the main page."""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return HTMLResponse(content=_render_page("index.html"))
 
 @app.get("/history", response_class=HTMLResponse)
 async def history(request: Request):
     """Serve the download history page."""
-    return templates.TemplateResponse("history.html", {"request": request})
+    return HTMLResponse(content=_render_page("history.html"))
 
 @app.post("/download")
 async def start_download(url: str = Form(...), filename: str = Form(None)):
@@ -78,7 +201,7 @@ async def start_download(url: str = Form(...), filename: str = Form(None)):
     try:
         # Validate URL
         if not url or not url.strip():
-            return JSONResponse(
+            return MsgspecJSONResponse(
                 status_code=400, 
                 content={"error": "URL is required"}
             )
@@ -87,14 +210,14 @@ async def start_download(url: str = Form(...), filename: str = Form(None)):
         custom_filename = filename.strip() if filename and filename.strip() else None
         
         # Create a unique download ID
-        download_id = f"download_{len(manager.active_connections)}_{hash(url)}"
+        download_id = f"dl_{uuid4().hex}"
         
         # Start download asynchronously
         asyncio.create_task(
             process_download(download_id, url, custom_filename)
         )
         
-        return JSONResponse(content={
+        return MsgspecJSONResponse(content={
             "status": "started",
             "download_id": download_id,
             "url": url,
@@ -103,7 +226,7 @@ async def start_download(url: str = Form(...), filename: str = Form(None)):
         
     except Exception as e:
         logger.error(f"Error starting download: {e}")
-        return JSONResponse(
+        return MsgspecJSONResponse(
             status_code=500,
             content={"error": str(e)}
         )
@@ -112,13 +235,10 @@ async def process_download(download_id: str, url: str, custom_filename: str = No
     """Process download and send updates via WebSocket."""
     
     def progress_callback(progress_info):
-        """Send progress updates to all connected clients."""
-        message = {
-            "type": "progress",
-            "download_id": download_id,
-            "data": progress_info
-        }
-        asyncio.create_task(manager.broadcast(json.dumps(message)))
+        """Record the latest progress; _flush_progress sends it to clients."""
+        # Nobody to show it to, e.g. no browser tab open
+        if manager.active_connections:
+            _latest_progress[download_id] = progress_info
     
     try:
         # Send start message
@@ -128,14 +248,7 @@ async def process_download(download_id: str, url: str, custom_filename: str = No
             "url": url,
             "filename": custom_filename
         }
-        await manager.broadcast(json.dumps(start_message))
-        
-        # Add download record to database
-        db_id = await database_service.add_download(
-            filename=custom_filename or f"download_{download_id}",
-            original_url=url,
-            source_type='manual'
-        )
+        await manager.broadcast(_dumps(start_message))
         
         # Perform download
         result = await download_service.download_audio(
@@ -144,125 +257,171 @@ async def process_download(download_id: str, url: str, custom_filename: str = No
             progress_callback
         )
         
-        # Update database record with completion status
+        # Record the outcome; a finished download is written in one INSERT
+        filename = custom_filename or f"download_{download_id}"
         if result['status'] == 'completed' and result.get('filepath'):
             file_path = Path(result['filepath'])
-            file_size = file_path.stat().st_size if file_path.exists() else 0
-            
-            # Extract metadata for database
-            metadata = download_service.metadata_service.extract_metadata_from_filename(file_path.name)
             
-            await database_service.update_download_success(
-                download_id=db_id,
-                file_path=str(file_path),
-                file_size=file_size
+            # Extract metadata for database; custom names were already sanitized
+            metadata = download_service.metadata_service.extract_metadata_from_filename(
+                file_path.name, pre_cleaned=bool(custom_filename)
             )
             
-            # Update with artist and track info if available
-            if metadata.get('artist') or metadata.get('title'):
-                await database_service.update_download_metadata(
-                    download_id=db_id,
-                    artist=metadata.get('artist'),
-                    track_name=metadata.get('title')
-                )
+            await database_service.record_completed_download(
+                filename=filename,
+                file_path=result['filepath'],
+                file_size=result.get('file_size', 0),
+                original_url=url,
+                source_type='manual',
+                artist=metadata.get('artist'),
+                track_name=metadata.get('title')
+            )
                 
-        elif result['status'] == 'error':
+        else:
+            # Errors, and "completed" downloads whose output file was never
+            # found, are still recorded so every download has a history row
+            if result['status'] == 'error':
+                error = result.get('error', 'Unknown error')
+            else:
+                error = 'Output file not found'
+            db_id = await database_service.add_download(
+                filename=filename,
+                original_url=url,
+                source_type='manual'
+            )
             await database_service.update_download_failed(
                 download_id=db_id,
-                error_message=result.get('error', 'Unknown error')
+                error_message=error
             )
         
+        # Drop any unsent progress so it can't arrive after the result
+        _latest_progress.pop(download_id, None)
+        
         # Send completion message
         complete_message = {
             "type": "complete",
             "download_id": download_id,
             "data": result
         }
-        await manager.broadcast(json.dumps(complete_message))
+        await manager.broadcast(_dumps(complete_message))
         
         logger.info(f"Download {download_id} completed: {result.get('status')}")
         
     except Exception as e:
         logger.error(f"Download {download_id} failed: {e}")
+        _latest_progress.pop(download_id, None)
         error_message = {
             "type": "error",
             "download_id": download_id,
             "error": str(e)
         }
-        await manager.broadcast(json.dumps(error_message))
+        await manager.broadcast(_dumps(error_message))
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time updates."""
     await manager.connect(websocket)
     try:
-        while True:
-            # Keep connection alive and listen for client messages
-            data = await websocket.receive_text()
+        # Keep connection alive and listen for client messages; the loop ends
+        # when the client disconnects
+        async for data in websocket.iter_text():
             logger.debug(f"Received WebSocket message: {data}")
             
-    except WebSocketDisconnect:
+    finally:
         manager.disconnect(websocket)
 
+# Encoded /api/supported-sites body; yt-dlp's extractor list can't change
+# while the process runs, so it is built on the first request and reused
+_sites_payload: Optional[bytes] = None
+
+def _build_sites_payload() -> bytes:
+    """Build the encoded supported-sites response body."""
+    sites = download_service.get_supported_sites()
+    # Return a subset of popular sites for the UI
+    popular_sites = [
+        'youtube', 'soundcloud', 'bandcamp', 'vimeo', 
+        'dailymotion', 'mixcloud', 'audiomack'
+    ]
+    
+    # If we got sites, filter for popular ones, otherwise use the fallback
+    if sites:
+        supported_popular = [site for site in popular_sites if site in sites]
+        if not supported_popular:
+            # If no matches found, return the first few from the full list
+            supported_popular = sites[:7] if len(sites) >= 7 else sites
+    else:
+        # Fallback to popular sites list
+        supported_popular = popular_sites
+    
+    return _dumps({
+        "popular_sites": supported_popular,
+        "total_supported": len(sites) if sites else len(popular_sites)
+    })
+
 @app.get("/api/supported-sites")
 async def get_supported_sites():
     """Get list of supported download sites."""
+    global _sites_payload
     try:
-        sites = download_service.get_supported_sites()
-        # Return a subset of popular sites for the UI
-        popular_sites = [
-            'youtube', 'soundcloud', 'bandcamp', 'vimeo', 
-            'dailymotion', 'mixcloud', 'audiomack'
-        ]
-        
-        # If we got sites, filter for popular ones, otherwise use the fallback
-        if sites:
-            supported_popular = [site for site in popular_sites if site in sites]
-            if not supported_popular:
-                # If no matches found, return the first few from the full list
-                supported_popular = sites[:7] if len(sites) >= 7 else sites
-        else:
-            # Fallback to popular sites list
-            supported_popular = popular_sites
-        
-        return JSONResponse(content={
-            "popular_sites": supported_popular,
-            "total_supported": len(sites) if sites else len(popular_sites)
-        })
+        if _sites_payload is None:
+            # Listing yt-dlp's extractors is slow; keep it off the event loop
+            _sites_payload = await anyio.to_thread.run_sync(_build_sites_payload)
+        return Response(content=_sites_payload, media_type="application/json")
         
     except Exception as e:
         logger.error(f"Error getting supported sites: {e}")
         # Return fallback data instead of error
-        return JSONResponse(content={
+        return MsgspecJSONResponse(content={
             "popular_sites": ['youtube', 'soundcloud', 'bandcamp', 'vimeo', 'dailymotion', 'mixcloud'],
             "total_supported": 1000
         })
 
+def _scan_downloads(download_path: Path) -> Optional[List[Tuple[str, os.stat_result]]]:
+    """List the mp3 files in the download folder.
+    
+    Args:
+        download_path: Download folder
+    
+    Returns:
+        (name, stat) pairs, or None if the folder doesn't exist
+    """
+    # The folder is created at startup, so only a folder removed while the
+    # server runs gets here without one; no separate exists() check
+    try:
+        with os.scandir(download_path) as entries:
+            return [
+                (entry.name, entry.stat())
+                for entry in entries
+                if entry.name.endswith('.mp3') and entry.is_file()
+            ]
+    except FileNotFoundError:
+        return None
+
 @app.get("/api/downloads")
 async def get_downloads():
     """Get list of downloaded files."""
     try:
-        download_path = Config.DOWNLOAD_PATH
-        if not download_path.exists():
-            return JSONResponse(content={"files": []})
+        # Directory reads are blocking; do them in a worker thread from the
+        # AnyIO pool, whose limit the lifespan hook raises
+        files = await anyio.to_thread.run_sync(_scan_downloads, Config.DOWNLOAD_PATH)
+        if files is None:
+            return MsgspecJSONResponse(content={"files": []})
         
-        files = []
-        for file_path in download_path.glob("*.mp3"):
-            stat = file_path.stat()
-            files.append({
-                "name": file_path.name,
+        # Newest first, limited to the configured number of recent downloads;
+        # only those files are turned into response entries
+        recent = heapq.nlargest(Config.MAX_RECENT_DOWNLOADS, files, key=lambda f: f[1].st_ctime)
+        limited_files = [
+            {
+                "name": name,
                 "size": stat.st_size,
                 "created": stat.st_ctime,
-                "path": str(file_path.relative_to(download_path))
-            })
-        
-        # Sort by creation time (newest first)
-        files.sort(key=lambda x: x['created'], reverse=True)
-        
-        # Limit to configured number of recent downloads
-        limited_files = files[:Config.MAX_RECENT_DOWNLOADS]
+                # Files sit directly in the download folder
+                "path": name
+            }
+            for name, stat in recent
+        ]
         
-        return JSONResponse(content={
+        return MsgspecJSONResponse(content={
             "files": limited_files,
             "total_files": len(files),
             "showing": len(limited_files),
@@ -271,7 +430,7 @@ async def get_downloads():
         
     except Exception as e:
         logger.error(f"Error getting downloads: {e}")
-        return JSONResponse(
+        return MsgspecJSONResponse(
             status_code=500,
             content={"error": "Failed to get downloads"}
         )
@@ -281,11 +440,11 @@ async def get_download_stats():
     """Get download statistics from database."""
     try:
         stats = await database_service.get_download_stats()
-        return JSONResponse(content=stats)
+        return MsgspecJSONResponse(content=stats)
         
     except Exception as e:
         logger.error(f"Error getting download stats: {e}")
-        return JSONResponse(
+        return MsgspecJSONResponse(
             status_code=500,
             content={"error": "Failed to get download statistics"}
         )
@@ -296,36 +455,50 @@ async def get_download_history(
     limit: int = 50,
     search: str = None,
     status: str = None,
-    source: str = None
+    source: str = None,
+    count: bool = True
 ):
-    """Get paginated download history from database."""
+    """Get paginated download history from database.
+    
+    Pass count=false to skip the total count (total and total_pages are null).
+    With a search term, status and source are ignored and the total counts
+    the search matches.
+    """
     try:
         offset = (page - 1) * limit
         
-        # Get downloads with filters
-        downloads = await database_service.get_all_downloads(
-            limit=limit,
-            offset=offset,
-            status_filter=status,
-            source_filter=source
-        )
-        
-        # If search term provided, use search instead
-        if search and search.strip():
-            downloads = await database_service.search_downloads(
-                search_term=search.strip(),
-                limit=limit
+        # A search term replaces the filtered listing, and its total counts
+        # the search matches rather than the listing
+        search = search.strip() if search else None
+        if search:
+            rows = database_service.search_downloads(
+                search_term=search,
+                limit=limit,
+                offset=offset
             )
+            total = database_service.get_search_count(search) if count else None
+        else:
+            rows = database_service.get_all_downloads(
+                limit=limit,
+                offset=offset,
+                status_filter=status,
+                source_filter=source
+            )
+            total = database_service.get_count(
+                status_filter=status,
+                source_filter=source
+            ) if count else None
         
-        # Get total count for pagination
-        total_count = await database_service.get_count(
-            status_filter=status,
-            source_filter=source
-        )
-        
-        total_pages = (total_count + limit - 1) // limit
+        # Get total count for pagination; reads use separate pooled
+        # connections, so it runs alongside the listing
+        if total is not None:
+            downloads, total_count = await asyncio.gather(rows, total)
+            total_pages = (total_count + limit - 1) // limit
+        else:
+            downloads = await rows
+            total_count = total_pages = None
         
-        return JSONResponse(content={
+        return MsgspecJSONResponse(content={
             "downloads": downloads,
             "pagination": {
                 "current_page": page,
@@ -338,7 +511,7 @@ async def get_download_history(
         
     except Exception as e:
         logger.error(f"Error getting download history: {e}")
-        return JSONResponse(
+        return MsgspecJSONResponse(
             status_code=500,
             content={"error": "Failed to get download history"}
         )
@@ -346,11 +519,7 @@ async def get_download_history(
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return JSONResponse(content={
-        "status": "healthy",
-        "download_path": str(Config.DOWNLOAD_PATH),
-        "download_path_exists": Config.DOWNLOAD_PATH.exists()
-    })
+    return Response(content=_health_body, media_type="application/json")
 
 if __name__ == "__main__":
     # Setup logging
@@ -379,5 +548,9 @@ if __name__ == "__main__":
         host=Config.WEB_HOST,
         port=Config.WEB_PORT,
         reload=True,
-        log_level="info"
+        log_level="info",
+        # uvloop has no Windows build
+        loop="uvloop" if sys.platform != 'win32' else "asyncio",
+        http="httptools",
+        ws="websockets"
     )
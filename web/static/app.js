@@ -19,14 +19,20 @@ class AudioFetcher {
 		const wsUrl = `${protocol}//${window.location.host}/ws`;
 
 		this.ws = new WebSocket(wsUrl);
+		// Updates arrive as binary frames holding UTF-8 JSON
+		this.ws.binaryType = 'arraybuffer';
+		this.decoder = new TextDecoder();
 
 		this.ws.onopen = () => {
 			console.log('WebSocket connected');
 		};
 
 		this.ws.onmessage = (event) => {
-			const data = JSON.parse(event.data);
-			this.handleWebSocketMessage(data);
+			const text =
+				typeof event.data === 'string'
+					? event.data
+					: this.decoder.decode(event.data);
+			this.handleWebSocketMessage(JSON.parse(text));
 		};
 
 		this.ws.onclose = () => {
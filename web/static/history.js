@@ -207,7 +207,7 @@ class DownloadHistory {
 				<td class="size-cell">${
 					download.file_size ? this.formatFileSize(download.file_size) : '-'
 				}</td>
-				<td class="date-cell" title="${download.created_at}">
+				<td class="date-cell" title="${new Date(download.created_at).toISOString()}">
 					${download.created_at_formatted || '-'}
 				</td>
 			</tr>